@@ -5,6 +5,9 @@ from models.base import Base
 from core.config import settings
 from models.account import Account
 from models.data import Data
+from models.series_state import SeriesState
+from models.kalman_model import KalmanModel
+from models.job import Job
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
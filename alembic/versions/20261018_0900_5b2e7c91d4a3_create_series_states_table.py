@@ -0,0 +1,44 @@
+"""create_series_states_table
+
+Revision ID: 5b2e7c91d4a3
+Revises: d8031a612b1d
+Create Date: 2026-10-18 09:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e7c91d4a3'
+down_revision: Union[str, None] = 'd8031a612b1d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('series_states',
+    sa.Column('unique_identifier', sa.String(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('n_observations', sa.Integer(), nullable=False),
+    sa.Column('x', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('P', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('raw_state', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('raw_cov', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('filtered_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('smooth_state', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'unique_identifier', name='uq_series_states_account_identifier')
+    )
+    op.create_index(op.f('ix_series_states_id'), 'series_states', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_series_states_id'), table_name='series_states')
+    op.drop_table('series_states')
@@ -0,0 +1,87 @@
+"""pack_series_arrays
+
+Revision ID: a71c3e5f9b20
+Revises: 5b2e7c91d4a3
+Create Date: 2026-10-18 09:30:00.000000+00:00
+
+"""
+import json
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from models.types import pack_array, unpack_array
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71c3e5f9b20'
+down_revision: Union[str, None] = '5b2e7c91d4a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_CHECKPOINT_COLUMNS = ['x', 'P', 'raw_state', 'raw_cov', 'filtered_data', 'smooth_state']
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def _legacy_weeks(weeks):
+    """(weeks, items) array of a legacy JSONB row, or None if ragged or empty."""
+    try:
+        array = np.array(weeks, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 2 or array.size == 0:
+        return None
+    return array
+
+
+def upgrade() -> None:
+    op.add_column('data', sa.Column('observations', sa.LargeBinary(), nullable=True))
+    op.alter_column('data', 'data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               nullable=True)
+
+    # Move existing JSONB rows to the packed format
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, data FROM data WHERE data IS NOT NULL')).fetchall()
+    skipped = []
+    for row_id, weeks in rows:
+        array = _legacy_weeks(weeks)
+        if array is None:
+            # Rows stored before input was validated; left as JSONB
+            skipped.append(row_id)
+            continue
+        connection.execute(
+            sa.text('UPDATE data SET observations = :observations, data = NULL WHERE id = :id'),
+            {'observations': pack_array(array), 'id': row_id})
+    if skipped:
+        logger.warning('Left %d data rows with ragged or empty weeks as JSONB, ids: %s',
+                       len(skipped), skipped)
+
+    # Checkpoints are derived data and are rebuilt from `data` on the next save
+    op.execute('DELETE FROM series_states')
+    for column in _CHECKPOINT_COLUMNS:
+        op.drop_column('series_states', column)
+        op.add_column('series_states', sa.Column(column, sa.LargeBinary(), nullable=False))
+
+
+def downgrade() -> None:
+    op.execute('DELETE FROM series_states')
+    for column in _CHECKPOINT_COLUMNS:
+        op.drop_column('series_states', column)
+        op.add_column('series_states', sa.Column(
+            column, postgresql.JSONB(astext_type=sa.Text()), nullable=False))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, observations FROM data WHERE observations IS NOT NULL')).fetchall()
+    for row_id, observations in rows:
+        connection.execute(
+            sa.text('UPDATE data SET data = CAST(:data AS JSONB) WHERE id = :id'),
+            {'data': json.dumps(unpack_array(observations).tolist()), 'id': row_id})
+
+    op.alter_column('data', 'data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               nullable=False)
+    op.drop_column('data', 'observations')
@@ -0,0 +1,71 @@
+"""add_series_sequence_numbers
+
+Revision ID: c4d9a2e61f73
+Revises: a71c3e5f9b20
+Create Date: 2026-10-18 10:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d9a2e61f73'
+down_revision: Union[str, None] = 'a71c3e5f9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_TIMESTAMPED_TABLES = ['accounts', 'data', 'series_states']
+
+
+def upgrade() -> None:
+    # Number existing chunks per series. created_at used to be fixed at
+    # import time, so the id breaks ties in insertion order.
+    op.add_column('data', sa.Column('seq', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE data SET seq = numbered.seq
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY account_id, unique_identifier
+                ORDER BY created_at, id
+            ) - 1 AS seq
+            FROM data
+        ) AS numbered
+        WHERE data.id = numbered.id
+    """)
+    op.alter_column('data', 'seq', existing_type=sa.Integer(), nullable=False)
+    op.create_index('ix_data_account_identifier_seq', 'data',
+                    ['account_id', 'unique_identifier', 'seq'], unique=True)
+    op.drop_index('ix_data_unique_identifier', table_name='data')
+
+    op.add_column('series_states', sa.Column(
+        'next_seq', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE series_states SET next_seq = (
+            SELECT COUNT(*) FROM data
+            WHERE data.account_id = series_states.account_id
+            AND data.unique_identifier = series_states.unique_identifier
+        )
+    """)
+
+    for table in _TIMESTAMPED_TABLES:
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True),
+                        server_default=sa.func.now())
+        op.alter_column(table, 'updated_at', existing_type=sa.DateTime(timezone=True),
+                        server_default=sa.func.now())
+
+
+def downgrade() -> None:
+    for table in _TIMESTAMPED_TABLES:
+        op.alter_column(table, 'updated_at', existing_type=sa.DateTime(timezone=True),
+                        server_default=None)
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True),
+                        server_default=None)
+
+    op.drop_column('series_states', 'next_seq')
+
+    op.create_index('ix_data_unique_identifier', 'data', ['unique_identifier'], unique=False)
+    op.drop_index('ix_data_account_identifier_seq', table_name='data')
+    op.drop_column('data', 'seq')
@@ -0,0 +1,53 @@
+"""create_kalman_models_table
+
+Revision ID: e3b8f0d47a15
+Revises: c4d9a2e61f73
+Create Date: 2026-10-18 11:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8f0d47a15'
+down_revision: Union[str, None] = 'c4d9a2e61f73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('kalman_models',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('is_default', sa.Boolean(), nullable=False),
+    sa.Column('model_key', sa.String(), nullable=False),
+    sa.Column('F', sa.LargeBinary(), nullable=False),
+    sa.Column('H', sa.LargeBinary(), nullable=False),
+    sa.Column('Q', sa.LargeBinary(), nullable=False),
+    sa.Column('R', sa.LargeBinary(), nullable=False),
+    sa.Column('x0', sa.LargeBinary(), nullable=False),
+    sa.Column('P0', sa.LargeBinary(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'name', name='uq_kalman_models_account_name')
+    )
+    op.create_index(op.f('ix_kalman_models_id'), 'kalman_models', ['id'], unique=False)
+    op.create_index('uq_kalman_models_account_default', 'kalman_models', ['account_id'],
+                    unique=True, postgresql_where=sa.text('is_default'))
+
+    op.add_column('series_states', sa.Column('model_key', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('series_states', 'model_key')
+
+    op.drop_index('uq_kalman_models_account_default', table_name='kalman_models')
+    op.drop_index(op.f('ix_kalman_models_id'), table_name='kalman_models')
+    op.drop_table('kalman_models')
@@ -0,0 +1,123 @@
+from typing import Any, Dict, Optional
+import numpy as np
+from fastapi import Response
+from models.types import pack_array, unpack_array_from
+
+# Raw frames: `models.types.pack_array` layout, i.e. a dtype code, the ndim
+# and the little-endian uint32 dimensions, followed by little-endian data
+PACKED_MEDIA_TYPE = "application/octet-stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# Float dtypes accepted for typed arrays in MessagePack bodies
+_MSGPACK_DTYPES = {"<f8": np.dtype("<f8"), "<f4": np.dtype("<f4")}
+
+# Arrays of a Kalman result, in the order they are written to raw frames
+KALMAN_RESULT_ARRAYS = ("filtered_data", "raw_state", "smooth_state")
+# Arrays written after those for results with diagnostics
+KALMAN_DIAGNOSTIC_ARRAYS = ("log_likelihood", "normalized_innovations")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("MessagePack encoding requires the 'msgpack' package")
+    return msgpack
+
+
+def _media_type(header: Optional[str]) -> Optional[str]:
+    """Map a Content-Type or Accept header to a supported binary media type."""
+    header = (header or "").lower()
+    if any(media_type in header for media_type in _MSGPACK_MEDIA_TYPES):
+        return MSGPACK_MEDIA_TYPE
+    if PACKED_MEDIA_TYPE in header:
+        return PACKED_MEDIA_TYPE
+    return None
+
+
+def is_binary_media_type(header: Optional[str]) -> bool:
+    return _media_type(header) is not None
+
+
+def _decode_msgpack_array(value: Any) -> np.ndarray:
+    """
+    Rebuild a typed array map `{"dtype": "<f8", "shape": [...], "data": bytes}`
+    into a NumPy view on its data.
+    """
+    if not isinstance(value, dict) or not {"dtype", "shape", "data"} <= value.keys():
+        raise ValueError("Expected a typed array with dtype, shape and data")
+
+    dtype = _MSGPACK_DTYPES.get(value["dtype"])
+    if dtype is None:
+        raise ValueError(f"Unsupported array dtype: {value['dtype']}")
+
+    if not isinstance(value["data"], bytes):
+        raise ValueError("Array data must be binary")
+    try:
+        shape = tuple(int(dim) for dim in value["shape"])
+    except (TypeError, ValueError):
+        raise ValueError("Array shape must be a list of integers")
+    if len(value["data"]) != int(np.prod(shape)) * dtype.itemsize:
+        raise ValueError("Array data does not match its shape")
+    return np.frombuffer(value["data"], dtype=dtype).reshape(shape)
+
+
+def _encode_msgpack_array(array: np.ndarray) -> Dict[str, Any]:
+    array = np.ascontiguousarray(array, dtype="<f8")
+    return {"dtype": "<f8", "shape": list(array.shape), "data": array.tobytes()}
+
+
+def decode_observations(body: bytes, content_type: Optional[str]) -> np.ndarray:
+    """
+    Decode a binary request body straight into a (weeks, items) array.
+
+    Accepts either one raw packed frame (`application/octet-stream`) or a
+    MessagePack typed array map (`application/msgpack`).
+
+    Raises:
+        ValueError: If the body is malformed or not a non-empty 2D array
+    """
+    media_type = _media_type(content_type)
+    if media_type == PACKED_MEDIA_TYPE:
+        observations, end = unpack_array_from(body)
+        if end != len(body):
+            raise ValueError("Unexpected trailing bytes after the packed array")
+    elif media_type == MSGPACK_MEDIA_TYPE:
+        try:
+            value = _msgpack().unpackb(body)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid MessagePack body: {str(e)}")
+        observations = _decode_msgpack_array(value)
+    else:
+        raise ValueError(f"Unsupported content type: {content_type}")
+
+    if observations.ndim != 2 or observations.size == 0:
+        raise ValueError("Input data must be a non-empty 2D array of observations")
+    return observations
+
+
+def kalman_binary_response(result: Dict[str, Any], media_type: str) -> Response:
+    """
+    Encode a Kalman result in a binary media type.
+
+    Raw frames hold filtered_data (T,), raw_state (T + 1, n) and
+    smooth_state (T + 1, n) back to back, each with its own shape header,
+    followed by log_likelihood (T,) and normalized_innovations (T, m) for
+    results with diagnostics. MessagePack bodies map the same names to typed
+    arrays, plus data_count and total_log_likelihood.
+    """
+    names = KALMAN_RESULT_ARRAYS
+    if "log_likelihood" in result:
+        names = names + KALMAN_DIAGNOSTIC_ARRAYS
+
+    media_type = _media_type(media_type)
+    if media_type == PACKED_MEDIA_TYPE:
+        body = b"".join(pack_array(result[name]) for name in names)
+    else:
+        content = {name: _encode_msgpack_array(result[name]) for name in names}
+        content["data_count"] = result["data_count"]
+        if "total_log_likelihood" in result:
+            content["total_log_likelihood"] = result["total_log_likelihood"]
+        body = _msgpack().packb(content)
+    return Response(content=body, media_type=media_type)
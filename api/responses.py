@@ -0,0 +1,100 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Records serialised per chunk written to the socket
+_RECORDS_PER_CHUNK = 256
+
+
+def select_response_format(request: Request, format: Optional[str]) -> str:
+    """
+    Pick the response format from the `format` query parameter, falling back
+    to the Accept header and then to JSON.
+    """
+    if format:
+        return format
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return "ndjson"
+    return "json"
+
+
+def _kalman_records(result: Dict[str, Any], input_data: Optional[List[List[float]]]) -> Iterator[str]:
+    """
+    Yield one JSON line per timestep t = 0..T, built lazily from the filter
+    output arrays. Step t carries state t and, for t >= 1, the filtered value
+    H @ x_t and the observed week t - 1 that produced it, and with
+    diagnostics that week's log-likelihood and normalised innovations.
+    """
+    filtered_data = result["filtered_data"]
+    raw_state = result["raw_state"]
+    smooth_state = result["smooth_state"]
+    log_likelihood = result.get("log_likelihood")
+    normalized_innovations = result.get("normalized_innovations")
+
+    lines = []
+    for t in range(len(raw_state)):
+        record = {
+            "t": t,
+            "filtered_data": float(filtered_data[t - 1]) if t > 0 else None,
+            "raw_state": raw_state[t].tolist(),
+            "smooth_state": smooth_state[t].tolist(),
+        }
+        if input_data is not None:
+            record["input_data"] = input_data[t - 1] if t > 0 else None
+        if log_likelihood is not None:
+            record["log_likelihood"] = float(log_likelihood[t - 1]) if t > 0 else None
+            record["normalized_innovations"] = [
+                None if np.isnan(value) else float(value)
+                for value in normalized_innovations[t - 1]
+            ] if t > 0 else None
+        lines.append(json.dumps(record))
+
+        if len(lines) == _RECORDS_PER_CHUNK:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def kalman_ndjson_response(result: Dict[str, Any], input_data: Optional[List[List[float]]] = None) -> StreamingResponse:
+    """
+    Stream Kalman filter output as newline-delimited JSON, one record per
+    timestep, without building the full response body in memory.
+    """
+    return StreamingResponse(
+        _kalman_records(result, input_data), media_type=NDJSON_MEDIA_TYPE)
+
+
+class NumpyJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson, which serialises NumPy arrays natively.
+
+    Result arrays are written straight into the body without converting them
+    to Python lists or validating them against a response model first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def kalman_fast_json_response(result: Dict[str, Any], input_data: Optional[List[List[float]]] = None) -> NumpyJSONResponse:
+    """
+    Build the `KalmanOutput` body directly from the filter output arrays.
+    NaN (missing items in the normalised innovations) is written as null.
+    """
+    content = {
+        "filtered_data": result["filtered_data"],
+        "raw_state": result["raw_state"].ravel(),
+        "smooth_state": result["smooth_state"].ravel(),
+        "input_data": input_data,
+    }
+    for name in ("log_likelihood", "normalized_innovations", "total_log_likelihood"):
+        if name in result:
+            content[name] = result[name]
+    return NumpyJSONResponse(content)
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_db
+from core.result_cache import get_result_cache
+from services.kalman import get_kalman_coalescer
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -14,7 +17,23 @@ async def health_check():
 async def db_health_check(db: AsyncSession = Depends(get_db)):
     try:
         # Test database connection
-        await db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         return {"status": "database is healthy"}
     except Exception as e:
         return {"status": "database is unhealthy", "details": str(e)}
+
+
+@router.get("/cache")
+async def cache_health_check():
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return {"status": "result cache is disabled"}
+    return {"status": "result cache is enabled", "stats": result_cache.stats()}
+
+
+@router.get("/coalescer")
+async def coalescer_health_check():
+    coalescer = get_kalman_coalescer()
+    if coalescer is None:
+        return {"status": "request coalescing is disabled"}
+    return {"status": "request coalescing is enabled", "stats": coalescer.stats()}
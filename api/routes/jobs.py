@@ -0,0 +1,143 @@
+import numpy as np
+from fastapi import Depends, APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from api.encoding import is_binary_media_type, kalman_binary_response
+from api.responses import kalman_fast_json_response
+from core.api_key_cache import AccountIdentity
+from core.deps.check_api_key import verify_api_key
+from core.database import get_db
+from core.deps.check_quota import check_quota
+from core.jobs import FAILED, SUCCEEDED, JobInfo, JobLimitError, get_job_queue
+from sqlalchemy.ext.asyncio import AsyncSession
+from schemas.job import JobOutput
+from schemas.kalman import KalmanInput, KalmanOutput
+from services.model_registry import resolve_model
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["jobs"])
+
+
+def job_output(job: JobInfo) -> JobOutput:
+    return JobOutput(
+        job_id=job.id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+
+@router.post("/{account_id}/jobs/kalman", response_model=JobOutput, status_code=202)
+@check_quota
+async def submit_kalman_job(
+    account_id: int,
+    kalman_input: KalmanInput,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue a Kalman filter run and return right away with a job id.
+
+    Takes the same body as `/kalman`. Use this for long series and for saved
+    series with long histories: the filtering runs on a background worker
+    instead of holding the request and its database connection. Poll
+    `/jobs/{job_id}` for the status and fetch the output from
+    `/jobs/{job_id}/result` once it succeeded.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        observations = np.asarray(kalman_input.results, dtype=float)
+        if observations.ndim != 2 or observations.size == 0:
+            raise ValueError("Input data must contain non-empty lists of observations")
+        # Reject unknown models now rather than when the job runs
+        model = await resolve_model(db, account_id, kalman_input.model)
+        if observations.shape[1] != model.m:
+            raise ValueError(f"Every week must contain {model.m} observations")
+
+        job = await get_job_queue().submit(
+            db, account_id, "kalman",
+            params={
+                "save": kalman_input.save,
+                "unique_identifier": kalman_input.unique_identifier,
+                "full_smooth": kalman_input.full_smooth,
+                "model": kalman_input.model,
+                "diagnostics": kalman_input.diagnostics
+            },
+            observations=observations
+        )
+        return job_output(job)
+
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.exception("Unexpected error submitting a Kalman job")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _get_job(db: AsyncSession, account_id: int, job_id: int) -> JobInfo:
+    job = await get_job_queue().get(db, account_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/{account_id}/jobs/{job_id}", response_model=JobOutput)
+async def get_job_status(
+    account_id: int,
+    job_id: int,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """Return the status of a job."""
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    return job_output(await _get_job(db, account_id, job_id))
+
+
+@router.get(
+    "/{account_id}/jobs/{job_id}/result",
+    response_model=KalmanOutput,
+    responses={409: {"description": "The job has not succeeded (yet)"}}
+)
+async def get_job_result(
+    account_id: int,
+    job_id: int,
+    request: Request,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Return the output of a succeeded job.
+
+    Kalman jobs return the same arrays as `/kalman` (without the input),
+    or a binary encoding for a binary Accept header as in `/kalman/binary`.
+    Returns 409 while the job is queued or running, or if it failed.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    job = await _get_job(db, account_id, job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}.")
+
+    if job.kind != "kalman":
+        return JSONResponse(content=job.result)
+
+    result = {**job.result, **job.result_arrays}
+    accept = request.headers.get("accept", "")
+    if is_binary_media_type(accept):
+        return kalman_binary_response(result, accept)
+    return kalman_fast_json_response(result)
@@ -1,24 +1,47 @@
-from fastapi import Depends, APIRouter, HTTPException
+from typing import Literal, Optional
+import numpy as np
+from fastapi import Depends, APIRouter, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
-from models.account import Account
+from api.encoding import (
+    MSGPACK_MEDIA_TYPE, PACKED_MEDIA_TYPE, decode_observations,
+    is_binary_media_type, kalman_binary_response
+)
+from api.responses import kalman_fast_json_response, kalman_ndjson_response, select_response_format
+from core.api_key_cache import AccountIdentity
 from core.deps.check_api_key import verify_api_key
-from core.database import get_db
+from core.database import get_db, release_connection
 from core.deps.check_quota import check_quota
 from sqlalchemy.ext.asyncio import AsyncSession
-from schemas.kalman import KalmanInput, KalmanOutput
-from services.kalman import process_kalman_filter
+from core.executor import ExecutorSaturatedError, run_modelling
+from schemas.kalman import KalmanInput, KalmanOutput, KalmanBatchInput, KalmanBatchOutput
+from services.kalman import process_kalman_filter, process_kalman_batch
+from services.model_registry import resolve_model
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["kalman"])
 
 
-@router.post("/{account_id}/kalman", response_model=KalmanOutput)
+@router.post("/{account_id}/kalman", response_model=KalmanOutput,
+             response_model_exclude_unset=True)
 @check_quota
 async def kalman_filter(
     account_id: int,
     kalman_input: KalmanInput,
-    current_account: Account = Depends(verify_api_key),
+    request: Request,
+    format: Optional[Literal["json", "ndjson", "fast_json"]] = Query(
+        default=None,
+        description="Response format. Defaults to the Accept header: "
+                    "application/x-ndjson streams one record per timestep, "
+                    "anything else returns a single JSON object. fast_json "
+                    "returns the same object serialised directly from the "
+                    "result arrays, skipping response model validation."
+    ),
+    include_input: bool = Query(
+        default=True,
+        description="Whether to echo the input data in the response"
+    ),
+    current_account: AccountIdentity = Depends(verify_api_key),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -35,11 +58,25 @@ async def kalman_filter(
     ```
 
     If save is true, a special message will be returned instead of processing the filter.
+
+    Long series can be streamed as newline-delimited JSON with `format=ndjson`
+    or `Accept: application/x-ndjson`; each line holds the timestep `t`, the
+    states at `t` and the filtered value and input week that led to it.
+
+    `model` selects a model registered under `/{account_id}/models`; without
+    it the account's default model is used, or the shipped one.
+
+    With `diagnostics`, the response also holds the log-likelihood of every
+    input week given the weeks before it (including a saved history), the
+    innovations normalised by their predicted standard deviations, and the
+    total log-likelihood, e.g. to compare models or flag implausible weeks.
     """
     if current_account.id != account_id:
         raise HTTPException(status_code=404, detail="Account not found.")
 
     try:
+        model = await resolve_model(db, account_id, kalman_input.model)
+
         # Process the input data using the Kalman filter service
         if kalman_input.save:
             result = await process_kalman_filter(
@@ -47,26 +84,58 @@ async def kalman_filter(
                 save=kalman_input.save,
                 unique_identifier=kalman_input.unique_identifier,
                 db=db,
-                account_id=account_id
+                account_id=account_id,
+                full_smooth=kalman_input.full_smooth,
+                model=model,
+                diagnostics=kalman_input.diagnostics
             )
         else:
+            # Unsaved requests don't need the connection while they wait on
+            # the coalescer or the modelling executor
+            await release_connection(db)
             result = await process_kalman_filter(
                 input_data=kalman_input.results,
-                save=False
+                save=False,
+                model=model,
+                diagnostics=kalman_input.diagnostics
             )
 
         # Check if we got a special message response
         if "message" in result:
             return JSONResponse(content={"message": result["message"]})
 
+        input_data = kalman_input.results if include_input else None
+
+        response_format = select_response_format(request, format)
+        if response_format == "ndjson":
+            return kalman_ndjson_response(result, input_data)
+        if response_format == "fast_json":
+            return kalman_fast_json_response(result, input_data)
+
+        # Diagnostics are only set when requested, so they are left out of
+        # the response otherwise
+        diagnostics = {}
+        if kalman_input.diagnostics:
+            normalized_innovations = result["normalized_innovations"]
+            diagnostics = {
+                "log_likelihood": result["log_likelihood"].tolist(),
+                "normalized_innovations": np.where(
+                    np.isnan(normalized_innovations), None, normalized_innovations).tolist(),
+                "total_log_likelihood": result["total_log_likelihood"]
+            }
+
         # Return the results
         return KalmanOutput(
-            filtered_data=result["filtered_data"],
-            raw_state=result["raw_state"],
-            smooth_state=result["smooth_state"],
-            input_data=kalman_input.results
+            filtered_data=result["filtered_data"].tolist(),
+            raw_state=result["raw_state"].ravel().tolist(),
+            smooth_state=result["smooth_state"].ravel().tolist(),
+            input_data=input_data,
+            **diagnostics
         )
 
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
     except ValueError as e:
         # Handle validation errors
         #  logger.error(f"Validation error: {str(e)}")
@@ -74,4 +143,165 @@ async def kalman_filter(
 
     except Exception as e:
         # Handle unexpected error
+        logger.exception("Unexpected error in Kalman filter")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+_BINARY_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            PACKED_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            MSGPACK_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+
+@router.post(
+    "/{account_id}/kalman/binary",
+    openapi_extra=_BINARY_REQUEST_BODY,
+    responses={200: {"content": {
+        PACKED_MEDIA_TYPE: {}, MSGPACK_MEDIA_TYPE: {}, "application/json": {}}}}
+)
+@check_quota
+async def kalman_filter_binary(
+    account_id: int,
+    request: Request,
+    save: bool = Query(
+        default=False,
+        description="Whether to save the results to the database"
+    ),
+    unique_identifier: Optional[str] = Query(
+        default=None,
+        description="The unique identifier for the data"
+    ),
+    full_smooth: bool = Query(
+        default=False,
+        description="When extending a saved series, re-run the smoother over the "
+                    "whole history instead of the trailing lag window"
+    ),
+    model: Optional[str] = Query(
+        default=None,
+        description="Name of a registered model to filter with, or \"default\" for "
+                    "the shipped model. Defaults to the account's default model."
+    ),
+    diagnostics: bool = Query(
+        default=False,
+        description="Also return the log-likelihood and normalised innovations of "
+                    "every week, computed in the same filter pass"
+    ),
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Apply Kalman filtering to a binary encoded (weeks, items) array.
+
+    The request body is decoded straight into a NumPy array according to its
+    Content-Type:
+
+    - `application/octet-stream`: one packed frame, i.e. a dtype byte
+      (`d` for float64, `f` for float32), an ndim byte, ndim little-endian
+      uint32 dimensions, then the little-endian values in C order
+    - `application/msgpack`: a map `{"dtype": "<f8", "shape": [weeks, items],
+      "data": <bytes>}`
+
+    The response is encoded according to the Accept header, defaulting to
+    the request encoding. Packed responses hold filtered_data (T,),
+    raw_state (T + 1, n) and smooth_state (T + 1, n) as consecutive frames;
+    MessagePack responses map those names to typed arrays, plus data_count.
+    With `diagnostics`, log_likelihood (T,) and normalized_innovations (T, m)
+    follow as further frames or typed arrays, and MessagePack responses also
+    hold total_log_likelihood. `Accept: application/json` returns the arrays
+    as JSON. The input is not echoed.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    content_type = request.headers.get("content-type")
+    if not is_binary_media_type(content_type):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type must be {PACKED_MEDIA_TYPE} or {MSGPACK_MEDIA_TYPE}."
+        )
+
+    try:
+        observations = decode_observations(await request.body(), content_type)
+        compiled_model = await resolve_model(db, account_id, model)
+        if not save:
+            await release_connection(db)
+        result = await process_kalman_filter(
+            input_data=observations,
+            save=save,
+            unique_identifier=unique_identifier,
+            db=db if save else None,
+            account_id=account_id if save else None,
+            full_smooth=full_smooth,
+            model=compiled_model,
+            diagnostics=diagnostics
+        )
+
+        accept = request.headers.get("accept", "")
+        if is_binary_media_type(accept):
+            return kalman_binary_response(result, accept)
+        if "application/json" in accept:
+            return kalman_fast_json_response(result)
+        return kalman_binary_response(result, content_type)
+
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.exception("Unexpected error in binary Kalman filter")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{account_id}/kalman/batch", response_model=KalmanBatchOutput)
+@check_quota
+async def kalman_filter_batch(
+    account_id: int,
+    kalman_input: KalmanBatchInput,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Apply Kalman filtering to many independent time series in one request.
+
+    All series are filtered and smoothed together with the same model, and the
+    whole batch consumes one quota unit. Results are not saved.
+
+    Example:
+    ```json
+    {
+        "series": [
+            [[10.2, 10.5, 10.1, 9.8, 10.3]],
+            [[9.7, 10.1, 10.4, 10.0, 9.9], [10.2, 10.5, 10.1, 9.8, 10.3]]
+        ]
+    }
+    ```
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        model = await resolve_model(db, account_id, kalman_input.model)
+        if len(kalman_input.series[0][0]) != model.m:
+            raise ValueError(f"Every week must contain {model.m} observations")
+        await release_connection(db)
+        results = await run_modelling(
+            process_kalman_batch, kalman_input.series, model,
+            weight=sum(len(weeks) for weeks in kalman_input.series))
+        return KalmanBatchOutput(results=results)
+
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.exception("Unexpected error in Kalman filter batch")
         raise HTTPException(status_code=500, detail=str(e))
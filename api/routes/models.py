@@ -0,0 +1,185 @@
+from fastapi import Depends, APIRouter, HTTPException
+from core.api_key_cache import AccountIdentity
+from core.deps.check_api_key import verify_api_key
+from core.database import get_db
+from core.deps.check_quota import check_quota
+from core.jobs import JobLimitError, get_job_queue
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.kalman_model import KalmanModel
+from schemas.job import JobOutput
+from schemas.kalman_model import KalmanModelInput, KalmanModelList, KalmanModelOutput, ModelFitInput
+from services.model_registry import (
+    DEFAULT_MODEL_NAME, get_model, list_models, register_model, resolve_model, set_default_model
+)
+# Registers the "fit_model" job handler
+import services.model_fitting  # noqa: F401
+from api.routes.jobs import job_output
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["models"])
+
+
+def _model_output(record: KalmanModel, include_matrices: bool = False) -> KalmanModelOutput:
+    output = KalmanModelOutput(
+        name=record.name,
+        description=record.description,
+        default=record.is_default,
+        model_key=record.model_key,
+        n_states=record.F.shape[0],
+        n_items=record.H.shape[0],
+        created_at=record.created_at
+    )
+    if include_matrices:
+        output.F = record.F.tolist()
+        output.H = record.H.tolist()
+        output.Q = record.Q.tolist()
+        output.R = record.R.tolist()
+        output.x0 = record.x0.ravel().tolist()
+        output.P0 = record.P0.tolist()
+    return output
+
+
+@router.post("/{account_id}/models", response_model=KalmanModelOutput, status_code=201)
+async def create_model(
+    account_id: int,
+    model_input: KalmanModelInput,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Register a Kalman filter model for the account.
+
+    The matrices are validated (consistent shapes, symmetric positive
+    semi-definite Q and P0, positive definite R) and stored once. Kalman
+    requests select the model by name with `model`, or use it implicitly
+    when it is registered with `default: true`. Models can't be changed
+    after registration; register a new one under another name instead.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        record = await register_model(
+            db, account_id,
+            name=model_input.name,
+            F=model_input.F,
+            H=model_input.H,
+            Q=model_input.Q,
+            R=model_input.R,
+            x0=model_input.x0,
+            P0=model_input.P0,
+            description=model_input.description,
+            is_default=model_input.default
+        )
+        return _model_output(record, include_matrices=True)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.exception("Unexpected error registering a model")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{account_id}/models/fit", response_model=JobOutput, status_code=202)
+@check_quota
+async def submit_model_fit(
+    account_id: int,
+    fit_input: ModelFitInput,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue a maximum-likelihood fit of Q and R to the account's stored series
+    and return right away with a job id.
+
+    The fit runs expectation-maximisation from `base_model`, keeping its F,
+    H, x0 and P0, over all series at once, and registers the estimates as a
+    new model called `name`. Poll `/jobs/{job_id}`; the result of a
+    succeeded job holds the model name, the number of iterations, whether
+    the fit converged and the log-likelihood of every iteration.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        # Reject what would make the job fail right away
+        if fit_input.name == DEFAULT_MODEL_NAME:
+            raise ValueError(f"The model name '{DEFAULT_MODEL_NAME}' is reserved")
+        if await get_model(db, account_id, fit_input.name) is not None:
+            raise ValueError(f"A model named '{fit_input.name}' already exists")
+        await resolve_model(db, account_id, fit_input.base_model)
+
+        job = await get_job_queue().submit(
+            db, account_id, "fit_model", params=fit_input.model_dump())
+        return job_output(job)
+
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.exception("Unexpected error submitting a model fit")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{account_id}/models", response_model=KalmanModelList,
+            response_model_exclude_none=True)
+async def get_models(
+    account_id: int,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the models registered for the account, without their matrices."""
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    records = await list_models(db, account_id)
+    return KalmanModelList(models=[_model_output(record) for record in records])
+
+
+@router.get("/{account_id}/models/{name}", response_model=KalmanModelOutput)
+async def get_model_by_name(
+    account_id: int,
+    name: str,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """Return a registered model with its matrices."""
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    record = await get_model(db, account_id, name)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
+    return _model_output(record, include_matrices=True)
+
+
+@router.put("/{account_id}/models/{name}/default", response_model=KalmanModelList,
+            response_model_exclude_none=True)
+async def make_default_model(
+    account_id: int,
+    name: str,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Make a registered model the account's default, used by Kalman requests
+    that don't name a model. `default` reverts to the shipped model.
+
+    Other workers pick up the change within MODEL_REGISTRY_TTL seconds.
+    Returns the account's models.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        await set_default_model(db, account_id, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    records = await list_models(db, account_id)
+    return KalmanModelList(models=[_model_output(record) for record in records])
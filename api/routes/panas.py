@@ -1,11 +1,12 @@
 from fastapi import Depends, APIRouter, HTTPException
-from models.account import Account
+from core.api_key_cache import AccountIdentity
 from core.deps.check_api_key import verify_api_key
 from core.database import get_db
 from core.deps.check_quota import check_quota
 from sqlalchemy.ext.asyncio import AsyncSession
-from schemas.panas import PanasInput, PanasOutput
-from services.panas import process_panas_form
+from core.config import settings
+from schemas.panas import PanasInput, PanasOutput, PanasBatchInput, PanasBatchOutput
+from services.panas import process_panas_form, process_panas_batch
 
 router = APIRouter(tags=["panas"])
 
@@ -15,7 +16,7 @@ router = APIRouter(tags=["panas"])
 async def process_panas(
     account_id: int,
     panas_input: PanasInput,
-    current_account: Account = Depends(verify_api_key),
+    current_account: AccountIdentity = Depends(verify_api_key),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -48,3 +49,49 @@ async def process_panas(
     except Exception as e:
         # Handle unexpected errors
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def panas_batch_quota_cost(kwargs) -> int:
+    """
+    Quota units charged for a batch: one per batch, or one per started
+    block of PANAS_BATCH_ROWS_PER_QUOTA_UNIT forms when that is set.
+    """
+    rows_per_unit = settings.PANAS_BATCH_ROWS_PER_QUOTA_UNIT
+    if rows_per_unit <= 0:
+        return 1
+    return max(1, -(-len(kwargs["panas_input"].results) // rows_per_unit))
+
+
+@router.post("/{account_id}/panas/batch", response_model=PanasBatchOutput)
+@check_quota(cost=panas_batch_quota_cost)
+async def process_panas_batch_forms(
+    account_id: int,
+    panas_input: PanasBatchInput,
+    current_account: AccountIdentity = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Score many PANAS forms, e.g. a whole survey wave, in one request.
+
+    Takes an (N, 20) matrix of Likert scale responses (1-5), one form per
+    row, and returns the Positive Affect (PA) and Negative Affect (NA) score
+    of every row, in input order.
+
+    Consumes one quota unit per batch, or one per started block of
+    PANAS_BATCH_ROWS_PER_QUOTA_UNIT forms when configured.
+    """
+    if current_account.id != account_id:
+        raise HTTPException(status_code=404, detail="Account not found.")
+
+    try:
+        scores = process_panas_batch(panas_input.results)
+        return PanasBatchOutput(
+            positive_affect=scores[:, 0].tolist(),
+            negative_affect=scores[:, 1].tolist()
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
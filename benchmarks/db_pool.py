@@ -0,0 +1,113 @@
+"""
+Load benchmark for connection pool wait time under concurrency.
+
+Simulates the database pattern of one Kalman request: API key lookup, quota
+decrement with commit, modelling work off the connection, then a service
+query. Two session strategies are compared against the configured Postgres:
+
+- per_statement: a session bound to the engine, which checks a connection
+  out on its first statement and returns it on commit, as
+  `core.database.get_db` does now (committing before the modelling)
+- per_request: a session bound to one connection for the whole request,
+  held through the modelling (previous behaviour)
+
+Usage:
+    python -m benchmarks.db_pool --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from core.config import settings
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def _instrument_pool(engine, waits):
+    """Record how long every checkout waits for a pooled connection."""
+    pool = engine.sync_engine.pool
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            waits.append(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+
+
+async def _simulated_request(session: AsyncSession, compute_s: float):
+    await session.execute(text("SELECT 1"))   # API key lookup
+    await session.execute(text("SELECT 1"))   # quota decrement
+    await session.commit()
+    await asyncio.sleep(compute_s)            # modelling on the executor
+    await session.execute(text("SELECT 1"))   # service query
+    await session.commit()
+
+
+async def _run_mode(mode: str, args) -> dict:
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        pool_size=args.pool_size,
+        max_overflow=args.max_overflow,
+        pool_timeout=args.pool_timeout,
+        pool_pre_ping=settings.DB_POOL_PRE_PING
+    )
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    waits, latencies = [], []
+    _instrument_pool(engine, waits)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "per_request":
+                async with engine.connect() as connection:
+                    async with session_factory(bind=connection) as session:
+                        await _simulated_request(session, args.compute_ms / 1000)
+            else:
+                async with session_factory() as session:
+                    await _simulated_request(session, args.compute_ms / 1000)
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    return {
+        "mode": mode,
+        "requests_per_second": args.requests / elapsed,
+        "checkouts_per_request": len(waits) / args.requests,
+        "pool_wait_total_s": sum(waits),
+        "pool_wait_p50_ms": _percentile(waits, 50) * 1000,
+        "pool_wait_p99_ms": _percentile(waits, 99) * 1000,
+        "latency_p50_ms": _percentile(latencies, 50) * 1000,
+        "latency_p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+async def main(args):
+    results = [await _run_mode(mode, args) for mode in ("per_statement", "per_request")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--compute-ms", type=float, default=5.0)
+    parser.add_argument("--pool-size", type=int, default=settings.DB_POOL_SIZE)
+    parser.add_argument("--max-overflow", type=int, default=settings.DB_MAX_OVERFLOW)
+    parser.add_argument("--pool-timeout", type=float, default=settings.DB_POOL_TIMEOUT)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""
+Microbenchmark of Kalman response build time.
+
+Compares, for series of 10, 100 and 1000 weeks:
+
+- pydantic: the default path, converting result arrays to lists, building a
+  KalmanOutput, validating it against the response model and serialising
+  it, as FastAPI does for `response_model=KalmanOutput`
+- fast_json: NumpyJSONResponse rendering the arrays directly with orjson
+
+Usage:
+    python -m benchmarks.response_serialization
+"""
+import argparse
+import json
+import timeit
+import numpy as np
+from pydantic import TypeAdapter
+from api.responses import kalman_fast_json_response
+from schemas.kalman import KalmanOutput
+
+_response_adapter = TypeAdapter(KalmanOutput)
+
+
+def _result(weeks: int, n_items: int = 28):
+    rng = np.random.default_rng(0)
+    return {
+        "filtered_data": rng.normal(size=weeks),
+        "raw_state": rng.normal(size=(weeks + 1, 1)),
+        "smooth_state": rng.normal(size=(weeks + 1, 1)),
+    }, rng.uniform(1, 5, size=(weeks, n_items)).tolist()
+
+
+def _pydantic_response(result, input_data) -> bytes:
+    output = KalmanOutput(
+        filtered_data=result["filtered_data"].tolist(),
+        raw_state=result["raw_state"].ravel().tolist(),
+        smooth_state=result["smooth_state"].ravel().tolist(),
+        input_data=input_data
+    )
+    validated = _response_adapter.validate_python(output, from_attributes=True)
+    return _response_adapter.dump_json(validated)
+
+
+def _fast_json_response(result, input_data) -> bytes:
+    return kalman_fast_json_response(result, input_data).body
+
+
+def main(args):
+    results = []
+    for weeks in args.weeks:
+        result, input_data = _result(weeks)
+        for include_input in (True, False):
+            payload = input_data if include_input else None
+            row = {"weeks": weeks, "include_input": include_input}
+            for name, build in (("pydantic", _pydantic_response), ("fast_json", _fast_json_response)):
+                timer = timeit.Timer(lambda: build(result, payload))
+                loops, _ = timer.autorange()
+                best = min(timer.repeat(repeat=args.repeat, number=loops)) / loops
+                row[f"{name}_us"] = best * 1e6
+            row["speedup"] = row["pydantic_us"] / row["fast_json_us"]
+            results.append(row)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--weeks", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,297 @@
+"""
+Benchmark suite for the modelling hot paths, with baseline comparison.
+
+Cases, each over series lengths and ratios of missing items:
+
+- kalman_forward: `KalmanFilter.forward` as built by `make_kalman_filter`
+- kalman_smooth: `KalmanFilter.smooth` on the output of one forward pass
+- batch_forward: `BatchKalmanFilter.forward` on a cohort of series
+- panas_form: `process_panas_form` on one form
+- kalman_route: POST /kalman with a JSON body (no missing items, since
+  JSON has no NaN), in-process through the full FastAPI stack
+- kalman_route_binary: POST /kalman/binary with a packed frame body
+
+The routes run against a stand-in session with API key and quota checks
+overridden, and with the result cache disabled, so only the request
+handling and the modelling are measured.
+
+Every case reports the best and median time per call. Results are written
+as JSON; with --baseline they are compared against an earlier run and the
+process exits with status 1 if any case got slower than the tolerance.
+
+Usage:
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.suite --quick --only kalman_forward kalman_smooth
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+import numpy as np
+
+_WEEKS = [1, 10, 100, 1000, 5000]
+_QUICK_WEEKS = [1, 100, 1000]
+_MISSING = [0.0, 0.1, 0.5]
+_BATCH_SERIES = 64
+
+
+def _observations(weeks: int, missing: float, seed: int = 0) -> np.ndarray:
+    """Likert-like (weeks, 28) observations with a random share of NaN items."""
+    rng = np.random.default_rng(seed)
+    observations = rng.uniform(1, 5, size=(weeks, 28))
+    observations[rng.random(observations.shape) < missing] = np.nan
+    return observations
+
+
+def _kalman_forward(weeks, missing):
+    from modelling.constants import F, H, Q, R, x0
+    from modelling.kalman_filter import make_kalman_filter
+
+    observations = _observations(weeks, missing)
+    return lambda: make_kalman_filter(F=F, H=H, Q=Q, R=R, x0=x0).forward(observations)
+
+
+def _kalman_smooth(weeks, missing):
+    from modelling.constants import F, H, Q, R, x0
+    from modelling.kalman_filter import make_kalman_filter
+
+    kf = make_kalman_filter(F=F, H=H, Q=Q, R=R, x0=x0)
+    states, covs, _ = kf.forward(_observations(weeks, missing))
+    return lambda: kf.smooth(states, covs)
+
+
+def _batch_forward(weeks, missing):
+    from modelling.batch_kalman_filter import BatchKalmanFilter
+    from modelling.constants import F, H, Q, R, x0
+
+    observations = np.stack([
+        _observations(weeks, missing, seed) for seed in range(_BATCH_SERIES)])
+    kf = BatchKalmanFilter(F=F, H=H, Q=Q, R=R, x0=x0)
+    return lambda: kf.forward(observations)
+
+
+def _panas_form(weeks, missing):
+    from services.panas import process_panas_form
+
+    form = np.random.default_rng(0).integers(1, 6, size=20).tolist()
+    return lambda: process_panas_form(form)
+
+
+def _route_client():
+    """
+    In-process client for the app with authentication, quota and the
+    database replaced by stand-ins.
+    """
+    from fastapi.testclient import TestClient
+    import core.deps.check_quota as check_quota
+    from core.api_key_cache import AccountIdentity
+    from core.config import settings
+    from core.database import get_db
+    from core.deps.check_api_key import verify_api_key
+    import main
+
+    account = AccountIdentity(id=1, account_name="benchmark", api_key=uuid.uuid4())
+
+    class NoRows:
+        def scalar_one_or_none(self):
+            return None
+
+    class StandInSession:
+        async def execute(self, query):
+            return NoRows()
+
+        async def commit(self):
+            pass
+
+        async def rollback(self):
+            pass
+
+        def in_transaction(self):
+            return False
+
+    async def verify():
+        return account
+
+    async def db():
+        yield StandInSession()
+
+    async def consume(account_id, db, amount=1):
+        return True
+
+    main.app.dependency_overrides[verify_api_key] = verify
+    main.app.dependency_overrides[get_db] = db
+    check_quota.check_and_decrement_quota = consume
+    settings.RESULT_CACHE_BACKEND = "none"
+    return TestClient(main.app), f"{settings.API_V1_PREFIX}/{account.id}/kalman"
+
+
+def _kalman_route(weeks, missing):
+    client, url = _route_client()
+    body = {"results": _observations(weeks, 0.0).tolist(), "save": False}
+
+    def request():
+        response = client.post(url, json=body)
+        assert response.status_code == 200, response.text
+    return request
+
+
+def _kalman_route_binary(weeks, missing):
+    from api.encoding import PACKED_MEDIA_TYPE
+    from models.types import pack_array
+
+    client, url = _route_client()
+    body = pack_array(_observations(weeks, missing))
+    headers = {"content-type": PACKED_MEDIA_TYPE}
+
+    def request():
+        response = client.post(f"{url}/binary", content=body, headers=headers)
+        assert response.status_code == 200, response.text
+    return request
+
+
+# name -> (setup(weeks, missing) returning the callable to time,
+#          whether the case depends on series length, on missing items)
+CASES: Dict[str, tuple] = {
+    "kalman_forward": (_kalman_forward, True, True),
+    "kalman_smooth": (_kalman_smooth, True, True),
+    "batch_forward": (_batch_forward, True, True),
+    "panas_form": (_panas_form, False, False),
+    "kalman_route": (_kalman_route, True, False),
+    "kalman_route_binary": (_kalman_route_binary, True, True),
+}
+
+
+def _time(func: Callable, repeat: int, max_seconds: float) -> dict:
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    # Keep slow cases within budget, at least 3 repeats of 1 loop
+    repeat = max(3, min(repeat, int(max_seconds / max(elapsed, 1e-9))))
+    per_call = [total / loops for total in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "best_us": min(per_call) * 1e6,
+        "median_us": statistics.median(per_call) * 1e6,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _case_id(result: dict) -> str:
+    params = ",".join(f"{key}={value}" for key, value in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def run(names: List[str], weeks: List[int], missing: List[float],
+        repeat: int, max_seconds: float) -> List[dict]:
+    results = []
+    for name in names:
+        setup, by_weeks, by_missing = CASES[name]
+        for n_weeks in (weeks if by_weeks else [None]):
+            for ratio in (missing if by_missing else [None]):
+                params = {}
+                if n_weeks is not None:
+                    params["weeks"] = n_weeks
+                if ratio is not None:
+                    params["missing"] = ratio
+                func = setup(n_weeks or 1, ratio or 0.0)
+                result = {"name": name, "params": params,
+                          **_time(func, repeat, max_seconds)}
+                print(f"{_case_id(result):55s} {result['best_us']:14.1f} us",
+                      file=sys.stderr)
+                results.append(result)
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[dict]:
+    """
+    Pair each result with the baseline case of the same name and params.
+
+    A case regresses when its best time exceeds the baseline best time by
+    more than `tolerance` (a fraction, 0.15 = 15%).
+    """
+    previous = {_case_id(result): result for result in baseline}
+    comparison = []
+    for result in results:
+        case_id = _case_id(result)
+        if case_id not in previous:
+            continue
+        ratio = result["best_us"] / previous[case_id]["best_us"]
+        comparison.append({
+            "case": case_id,
+            "baseline_us": previous[case_id]["best_us"],
+            "current_us": result["best_us"],
+            "ratio": ratio,
+            "status": "regressed" if ratio > 1 + tolerance else
+                      "improved" if ratio < 1 - tolerance else "unchanged",
+        })
+    return comparison
+
+
+def main(args):
+    names = args.only or list(CASES)
+    weeks = args.weeks or (_QUICK_WEEKS if args.quick else _WEEKS)
+    missing = args.missing or ([0.0, 0.1] if args.quick else _MISSING)
+    results = run(names, weeks, missing, args.repeat, args.max_seconds)
+    report = {"metadata": _metadata(), "results": results}
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline["metadata"]
+        report["comparison"] = compare(results, baseline["results"], args.tolerance)
+        regressed = any(row["status"] == "regressed" for row in report["comparison"])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        for row in report["comparison"]:
+            print(f"{row['case']:55s} {row['ratio']:6.2f}x  {row['status']}",
+                  file=sys.stderr)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", choices=list(CASES), metavar="CASE",
+                        help=f"Cases to run, from: {', '.join(CASES)}")
+    parser.add_argument("--weeks", type=int, nargs="+")
+    parser.add_argument("--missing", type=float, nargs="+",
+                        help="Ratios of missing items, e.g. 0 0.1 0.5")
+    parser.add_argument("--quick", action="store_true",
+                        help="Fewer lengths and missing ratios")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--max-seconds", type=float, default=2.0,
+                        help="Approximate time budget per case")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from uuid import UUID
+from sqlalchemy import event, inspect
+from models.account import Account
+from .config import settings
+
+
+@dataclass(frozen=True)
+class AccountIdentity:
+    """
+    The parts of an account needed to authorise a request.
+
+    Cached instead of the ORM object so it can outlive the session it was
+    loaded in.
+    """
+    id: int
+    account_name: str
+    api_key: UUID
+
+    @classmethod
+    def from_account(cls, account: Account) -> "AccountIdentity":
+        return cls(id=account.id, account_name=account.account_name,
+                   api_key=account.api_key)
+
+
+class ApiKeyCache:
+    """
+    LRU cache of API key -> account identity whose entries expire after
+    `ttl` seconds. Only accessed from the event loop, so no locking.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[UUID, Tuple[float, AccountIdentity]]" = OrderedDict()
+
+    def get(self, api_key: UUID) -> Optional[AccountIdentity]:
+        entry = self._entries.get(api_key)
+        if entry is None:
+            return None
+
+        expires_at, identity = entry
+        if expires_at < time.monotonic():
+            del self._entries[api_key]
+            return None
+
+        self._entries.move_to_end(api_key)
+        return identity
+
+    def set(self, identity: AccountIdentity):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+
+        self._entries[identity.api_key] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(identity.api_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_api_key(self, api_key: UUID):
+        self._entries.pop(api_key, None)
+
+    def invalidate_account(self, account_id: int):
+        for api_key, (_, identity) in list(self._entries.items()):
+            if identity.id == account_id:
+                del self._entries[api_key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+api_key_cache = ApiKeyCache(
+    ttl=settings.API_KEY_CACHE_TTL, max_size=settings.API_KEY_CACHE_SIZE)
+
+
+def invalidate_api_key(api_key: UUID):
+    """Drop a key from the cache, e.g. after it has been rotated or revoked."""
+    api_key_cache.invalidate_api_key(api_key)
+
+
+def invalidate_account(account_id: int):
+    """Drop every cached key of an account, e.g. after it has been deleted."""
+    api_key_cache.invalidate_account(account_id)
+
+
+# Invalidate automatically when accounts are changed through the ORM. Raw SQL
+# updates bypass these events and have to call the hooks above explicitly.
+@event.listens_for(Account, "after_update")
+def _invalidate_on_update(mapper, connection, target: Account):
+    for old_key in inspect(target).attrs.api_key.history.deleted:
+        invalidate_api_key(old_key)
+    invalidate_account(target.id)
+
+
+@event.listens_for(Account, "after_delete")
+def _invalidate_on_delete(mapper, connection, target: Account):
+    invalidate_account(target.id)
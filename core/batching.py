@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls into batches.
+
+    Items submitted within `max_wait` seconds of the first pending one, or
+    until `max_size` items are pending, are handed to `process_batch` in one
+    call; each submitter gets the result at its own position back. If the
+    batch fails, every submitter gets the exception. Only used from the
+    event loop, so no locking.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_wait: float, max_size: int):
+        self.process_batch = process_batch
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._batches = 0
+        self._items = 0
+        self._max_batch_size = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        # Batches per size bucket, keyed by the bucket's upper bound (1, 2, 4, ...)
+        self._batch_sizes: Dict[int, int] = {}
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.monotonic()))
+
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        # Drop callers that gave up while waiting for the window to close
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+
+        now = time.monotonic()
+        waits = [now - submitted_at for _, _, submitted_at in batch]
+        self._batches += 1
+        self._items += len(batch)
+        self._max_batch_size = max(self._max_batch_size, len(batch))
+        self._total_wait += sum(waits)
+        self._max_wait = max(self._max_wait, max(waits))
+        bucket = 1 << (len(batch) - 1).bit_length()
+        self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+
+        task = asyncio.create_task(self._process(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        try:
+            results = await self.process_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "pending": len(self._pending),
+            "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+            "max_batch_size": self._max_batch_size,
+            "batch_size_histogram": {
+                str(bucket): count for bucket, count in sorted(self._batch_sizes.items())},
+            "mean_wait_ms": self._total_wait / self._items * 1000 if self._items else 0.0,
+            "max_wait_ms": self._max_wait * 1000,
+        }
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Literal, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
 
@@ -14,6 +14,97 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str
     POSTGRES_DB: str
 
+    # Connection pool: persistent connections, extra connections allowed
+    # under load, seconds to wait for a free connection, seconds after which
+    # connections are replaced, and liveness check on checkout
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Number of trailing steps re-smoothed when a saved series is extended
+    # without requesting a full RTS pass
+    KALMAN_SMOOTH_LAG: int = 52
+    # Precision of saved observation series ("<f8" or "<f4")
+    SERIES_STORAGE_DTYPE: Literal["<f8", "<f4"] = "<f8"
+    # Maximum number of forms accepted by the batch PANAS endpoint, and the
+    # quota it costs: one unit per batch (0) or one unit per started block
+    # of PANAS_BATCH_ROWS_PER_QUOTA_UNIT forms
+    PANAS_BATCH_MAX_FORMS: int = 100000
+    PANAS_BATCH_ROWS_PER_QUOTA_UNIT: int = 0
+
+    # Measurement update of the single-series filter: "auto" picks the
+    # cheapest exact form for the model, "square_root" the most robust one
+    KALMAN_SOLVER: Literal["auto", "covariance", "information", "cholesky", "square_root"] = "auto"
+    # Unsaved single-series requests arriving within KALMAN_COALESCE_WINDOW_MS
+    # of each other are filtered together in one batch pass of at most
+    # KALMAN_COALESCE_MAX_SERIES series (0 disables coalescing)
+    KALMAN_COALESCE_WINDOW_MS: float = 0.0
+    KALMAN_COALESCE_MAX_SERIES: int = 64
+    # Registered models: compiled artifacts are kept for the
+    # MODEL_CACHE_SIZE most recently used models, and the model a request
+    # resolves to (by name or as the account default) is cached for
+    # MODEL_REGISTRY_TTL seconds (0 looks it up on every request)
+    MODEL_CACHE_SIZE: int = 32
+    MODEL_REGISTRY_TTL: float = 60.0
+    # Maximum number of series accepted by the batch Kalman endpoint
+    KALMAN_BATCH_MAX_SERIES: int = 10000
+
+    # Where CPU-bound modelling runs: on the event loop ("inline"), in a
+    # thread pool, or in a process pool for jobs of at least
+    # MODELLING_PROCESS_MIN_WEEKS weeks
+    MODELLING_EXECUTOR: Literal["inline", "thread", "process"] = "thread"
+    MODELLING_MAX_WORKERS: int = 4
+    # Jobs allowed to wait for a worker before requests are rejected with 503
+    MODELLING_MAX_QUEUE: int = 32
+    MODELLING_PROCESS_MIN_WEEKS: int = 500
+
+    # Background jobs: kept in process ("memory", lost on restart and only
+    # visible to the accepting worker) or in the jobs table ("database",
+    # claimed by any worker with SELECT ... FOR UPDATE SKIP LOCKED). Each
+    # process runs JOB_WORKERS consumers. An account may have
+    # JOB_MAX_RUNNING_PER_ACCOUNT jobs running and JOB_MAX_QUEUED_PER_ACCOUNT
+    # unfinished in total. Jobs not finished within JOB_LEASE_SECONDS are
+    # retried up to JOB_MAX_ATTEMPTS times, and finished jobs are removed
+    # after JOB_RETENTION_SECONDS.
+    JOB_QUEUE_BACKEND: Literal["memory", "database"] = "memory"
+    JOB_WORKERS: int = 2
+    JOB_MAX_RUNNING_PER_ACCOUNT: int = 1
+    JOB_MAX_QUEUED_PER_ACCOUNT: int = 100
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_LEASE_SECONDS: float = 600.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETENTION_SECONDS: float = 86400.0
+
+    # Quota accounting: row-locked decrement in Postgres ("database"), or a
+    # cached counter ("memory" for a single worker, "redis" shared) whose
+    # deltas are flushed to accounts.quota every QUOTA_SYNC_INTERVAL seconds;
+    # cached counters are refreshed from accounts.quota at the same interval
+    QUOTA_BACKEND: Literal["database", "memory", "redis"] = "database"
+    REDIS_URL: Optional[str] = None
+    QUOTA_SYNC_INTERVAL: float = 5.0
+
+    # Results of unsaved Kalman requests, keyed by a hash of the model and
+    # the observations: cached in process ("memory"), additionally shared
+    # through REDIS_URL ("redis"), or not at all ("none")
+    RESULT_CACHE_BACKEND: Literal["none", "memory", "redis"] = "memory"
+    RESULT_CACHE_TTL: float = 300.0
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Verified API keys are cached for API_KEY_CACHE_TTL seconds (0 disables)
+    API_KEY_CACHE_TTL: float = 60.0
+    API_KEY_CACHE_SIZE: int = 10000
+
+    # Root log level, per-logger overrides (e.g. {"services.kalman": "DEBUG"})
+    # and JSON lines output
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_JSON: bool = False
+    # Log SQL statements, keeping only a random fraction of them
+    LOG_SQL: bool = False
+    LOG_SQL_SAMPLE_RATE: float = 1.0
+
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
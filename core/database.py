@@ -4,8 +4,15 @@ from .config import settings
 
 engine = create_async_engine(
     settings.SQLALCHEMY_DATABASE_URI,
-    echo=True,
-    future=True
+    # Statement logging goes through the sqlalchemy.engine logger, see
+    # LOG_SQL in core/logging_config.py
+    echo=False,
+    future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -20,8 +27,27 @@ Base = declarative_base()
 
 
 async def get_db():
+    """
+    Yield the session of the current request.
+
+    FastAPI resolves a dependency once per request, so API key verification,
+    the quota check and the route all share this session. The session checks
+    a connection out of the pool on its first statement only, so requests
+    served from caches don't touch the pool, and returns it when the
+    transaction ends: on the quota decrement's own commit, in
+    `release_connection` before the modelling, or once the request
+    succeeds, when what it left open is committed.
+    """
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
+        await session.commit()
+
+
+async def release_connection(db: AsyncSession):
+    """
+    Commit the open transaction of a session, if any, returning its
+    connection to the pool ahead of a long wait such as the modelling
+    executor. The next statement checks a connection out again.
+    """
+    if db.in_transaction():
+        await db.commit()
@@ -4,22 +4,31 @@ from fastapi.security.api_key import APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from core.database import get_db
+from core.api_key_cache import AccountIdentity, api_key_cache
 from models.account import Account
 from uuid import UUID
 
 api_key_header = APIKeyHeader(name="X-API-KEY")
 
 
-async def verify_api_key(api_key: str = Security(api_key_header), db: AsyncSession = Depends(get_db)):
+async def verify_api_key(api_key: str = Security(api_key_header), db: AsyncSession = Depends(get_db)) -> AccountIdentity:
     try:
         api_key_uuid = UUID(api_key)
-        query = select(Account).where(Account.api_key == api_key_uuid)
-        result = await db.execute(query)
-        account = result.scalar_one_or_none()
-
-        if not account:
-            raise HTTPException(status_code=403, detail="Invalid API key")
-        return account
-
     except ValueError:
         raise HTTPException(status_code=403, detail="Invalid API key format")
+
+    # Recently verified keys skip the database round-trip
+    identity = api_key_cache.get(api_key_uuid)
+    if identity:
+        return identity
+
+    query = select(Account).where(Account.api_key == api_key_uuid)
+    result = await db.execute(query)
+    account = result.scalar_one_or_none()
+
+    if not account:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+
+    identity = AccountIdentity.from_account(account)
+    api_key_cache.set(identity)
+    return identity
@@ -1,43 +1,35 @@
 from fastapi import HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
 from functools import wraps
-from models.account import Account
-from core.database import get_db
-from typing import Callable, Any
+from core.api_key_cache import AccountIdentity
+from core.database import AsyncSessionLocal
+from core.quota import get_quota_backend
+from typing import Callable, Any, Dict, Optional
 
 
-async def check_and_decrement_quota(account_id: int, db: AsyncSession) -> bool:
+async def check_and_decrement_quota(account_id: int, db: AsyncSession, amount: int = 1) -> bool:
     """
     Check if quota is available and decrement atomically
     Returns True if quota was available and decremented, False otherwise
-    """
-    # Get current account with row lock to prevent race conditions
-    query = select(Account).where(
-        Account.id == account_id).with_for_update()
-    result = await db.execute(query)
-    account = result.scalar_one_or_none()
-
-    if not account or account.quota <= 0:
-        return False
-
-    # Use raw SQL to update only the quota column without triggering updated_at
-    # This avoids the timezone issue completely
-    raw_sql = text(
-        "UPDATE accounts SET quota = quota - 1 WHERE id = :account_id")
-    await db.execute(raw_sql, {"account_id": account_id})
-
-    # Commit the changes
-    await db.commit()
 
-    return True
+    The decrement is done by the backend selected with QUOTA_BACKEND, see
+    core/quota.py.
+    """
+    return await get_quota_backend().consume(account_id, db, amount)
 
 
-def check_quota(func: Callable) -> Callable:
+def check_quota(func: Optional[Callable] = None, *, cost: Optional[Callable[[Dict[str, Any]], int]] = None) -> Callable:
     """
     Decorator to check if an account has sufficient quota before 
     processing a request, and decrement quota if available
+
+    Charges one unit per request by default. `cost` computes the units to
+    charge from the route's keyword arguments instead, e.g.
+    `@check_quota(cost=lambda kwargs: len(kwargs["body"].rows))`.
     """
+    if func is None:
+        return lambda func: check_quota(func, cost=cost)
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
         # Extract necessary parameters
@@ -47,7 +39,7 @@ def check_quota(func: Callable) -> Callable:
         if not current_account or not db:
             # Try to get from dependencies if not in kwargs
             for arg in args:
-                if isinstance(arg, Account):
+                if isinstance(arg, AccountIdentity):
                     current_account = arg
                 elif isinstance(arg, AsyncSession):
                     db = arg
@@ -58,12 +50,15 @@ def check_quota(func: Callable) -> Callable:
                 detail="Implementation error: current_account not found"
             )
 
-        if not db:
-            # Get database session if not provided
-            db = await get_db()
+        amount = cost(kwargs) if cost is not None else 1
 
         # Check and decrement quota atomically
-        quota_available = await check_and_decrement_quota(current_account.id, db)
+        if db:
+            quota_available = await check_and_decrement_quota(current_account.id, db, amount)
+        else:
+            # The route doesn't take the request session, use a short-lived one
+            async with AsyncSessionLocal() as quota_db:
+                quota_available = await check_and_decrement_quota(current_account.id, quota_db, amount)
         if not quota_available:
             raise HTTPException(
                 status_code=403,
@@ -75,8 +70,8 @@ def check_quota(func: Callable) -> Callable:
             result = await func(*args, **kwargs)
             return result
         except Exception as e:
-            # If there's an error, we don't need to restore quota
-            # since it was already decremented in the atomic operation
+            # Quota isn't restored on errors: every backend has charged the
+            # request for good by now, the database one with its own commit
             raise e
 
     return wrapper
@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+from .config import settings
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+
+
+class ExecutorSaturatedError(Exception):
+    """
+    Raised when the modelling executor already holds as many jobs as
+    MODELLING_MAX_WORKERS + MODELLING_MAX_QUEUE allow.
+    """
+
+
+def _init_process_worker():
+    """
+    Preload the model constants and steady-state cache in each worker so the
+    first job a process runs doesn't pay for imports and the Riccati solve.
+    """
+    from modelling.constants import F, H, Q, R
+    from modelling.steady_state import get_steady_state
+    get_steady_state(F, H, Q, R)
+
+
+def start_executor():
+    """
+    Create the worker pools selected by MODELLING_EXECUTOR.
+
+    In "process" mode a thread pool is kept as well for jobs below
+    MODELLING_PROCESS_MIN_WEEKS, which would spend more time pickling
+    arguments than computing.
+    """
+    global _thread_pool, _process_pool
+
+    if settings.MODELLING_EXECUTOR == "inline":
+        return
+
+    _thread_pool = ThreadPoolExecutor(
+        max_workers=settings.MODELLING_MAX_WORKERS,
+        thread_name_prefix="modelling"
+    )
+    if settings.MODELLING_EXECUTOR == "process":
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.MODELLING_MAX_WORKERS,
+            initializer=_init_process_worker
+        )
+
+
+def shutdown_executor():
+    global _thread_pool, _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=True, cancel_futures=True)
+    _thread_pool = None
+    _process_pool = None
+
+
+def _select_executor(weight: int) -> Optional[Executor]:
+    if _process_pool is not None and weight >= settings.MODELLING_PROCESS_MIN_WEEKS:
+        return _process_pool
+    return _thread_pool
+
+
+async def run_modelling(func: Callable[..., Any], *args, weight: int = 0, **kwargs) -> Any:
+    """
+    Run a CPU-bound modelling function off the event loop.
+
+    Args:
+        func: Picklable function to run (a module-level function when
+              process workers are used)
+        weight: Size of the job, e.g. number of weeks, used to route large
+                jobs to process workers
+
+    Raises:
+        ExecutorSaturatedError: If the bounded queue is full
+    """
+    global _in_flight
+
+    executor = _select_executor(weight)
+    if executor is None:
+        return func(*args, **kwargs)
+
+    if _in_flight >= settings.MODELLING_MAX_WORKERS + settings.MODELLING_MAX_QUEUE:
+        raise ExecutorSaturatedError(
+            "Modelling workers are saturated, please retry later")
+
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+    finally:
+        _in_flight -= 1
@@ -0,0 +1,376 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Interval, bindparam, delete, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.base import utc_now
+from models.job import Job
+from models.types import pack_named_arrays, unpack_named_arrays
+from .config import settings
+from .database import AsyncSessionLocal
+from .executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+_UNFINISHED = (QUEUED, RUNNING)
+
+# Seconds a worker backs off after the modelling executor had no room for a job
+_SATURATED_BACKOFF = 0.5
+# Seconds between removals of expired finished jobs
+_PRUNE_INTERVAL = 60.0
+
+# A handler returns the JSON-serialisable part of the result and its arrays
+JobResult = Tuple[Dict[str, Any], Dict[str, np.ndarray]]
+JobHandler = Callable[["JobInfo"], Awaitable[JobResult]]
+
+_handlers: Dict[str, JobHandler] = {}
+_queue = None
+_worker_tasks: List[asyncio.Task] = []
+
+
+class JobLimitError(Exception):
+    """Raised when an account already has JOB_MAX_QUEUED_PER_ACCOUNT unfinished jobs."""
+
+
+@dataclass
+class JobInfo:
+    """
+    A job as handed to handlers and reported by the job endpoints,
+    independent of the queue backend.
+    """
+    id: int
+    account_id: int
+    kind: str
+    status: str
+    params: Dict[str, Any]
+    observations: Optional[np.ndarray] = None
+    attempts: int = 0
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    result_arrays: Optional[Dict[str, np.ndarray]] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobInfo":
+        return cls(
+            id=job.id,
+            account_id=job.account_id,
+            kind=job.kind,
+            status=job.status,
+            params=job.params,
+            observations=job.observations,
+            attempts=job.attempts,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            result=job.result,
+            result_arrays=unpack_named_arrays(job.result_arrays)
+            if job.result_arrays is not None else None,
+            error=job.error
+        )
+
+
+def register_job_handler(kind: str, handler: JobHandler):
+    """Run jobs of `kind` with `handler`."""
+    _handlers[kind] = handler
+
+
+class _JobQueue:
+    """Wake-up signalling shared by the backends."""
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._last_prune = time.monotonic()
+
+    def notify(self):
+        """Wake idle workers of this process, e.g. after a submit."""
+        self._wakeup.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def maybe_prune(self):
+        if time.monotonic() - self._last_prune < _PRUNE_INTERVAL:
+            return
+        self._last_prune = time.monotonic()
+        await self.prune()
+
+    async def prune(self):
+        pass
+
+
+class InMemoryJobQueue(_JobQueue):
+    """
+    Keeps jobs in process memory. Jobs are lost on restart and only visible
+    to the worker process that accepted them, so this is meant for single
+    worker deployments and development. Only used from the event loop, so
+    no locking.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._jobs: Dict[int, JobInfo] = {}
+        self._queued: Deque[int] = deque()
+        self._unfinished: Dict[int, int] = {}
+        self._running: Dict[int, int] = {}
+        self._ids = itertools.count(1)
+
+    async def submit(self, db: AsyncSession, account_id: int, kind: str,
+                     params: Dict[str, Any], observations: Optional[np.ndarray] = None) -> JobInfo:
+        if self._unfinished.get(account_id, 0) >= settings.JOB_MAX_QUEUED_PER_ACCOUNT:
+            raise JobLimitError("Too many unfinished jobs, please retry later")
+
+        job = JobInfo(id=next(self._ids), account_id=account_id, kind=kind,
+                      status=QUEUED, params=params, observations=observations,
+                      created_at=utc_now())
+        self._jobs[job.id] = job
+        self._queued.append(job.id)
+        self._unfinished[account_id] = self._unfinished.get(account_id, 0) + 1
+        self.notify()
+        return job
+
+    async def get(self, db: AsyncSession, account_id: int, job_id: int) -> Optional[JobInfo]:
+        job = self._jobs.get(job_id)
+        if job is None or job.account_id != account_id:
+            return None
+        return job
+
+    async def claim(self) -> Optional[JobInfo]:
+        """Start the oldest queued job of an account below its running limit."""
+        for position, job_id in enumerate(self._queued):
+            job = self._jobs[job_id]
+            if self._running.get(job.account_id, 0) < settings.JOB_MAX_RUNNING_PER_ACCOUNT:
+                del self._queued[position]
+                job.status = RUNNING
+                job.attempts += 1
+                job.started_at = utc_now()
+                self._running[job.account_id] = self._running.get(job.account_id, 0) + 1
+                return job
+        return None
+
+    def _finish(self, job: JobInfo, status: str):
+        job.status = status
+        job.finished_at = utc_now()
+        job.observations = None
+        self._running[job.account_id] -= 1
+        self._unfinished[job.account_id] -= 1
+        # The account may have jobs waiting for this one
+        self.notify()
+
+    async def complete(self, job: JobInfo, result: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        job.result = result
+        job.result_arrays = arrays
+        self._finish(job, SUCCEEDED)
+
+    async def fail(self, job: JobInfo, error: str):
+        job.error = error
+        self._finish(job, FAILED)
+
+    async def release(self, job: JobInfo):
+        """Put a claimed job back at the head of the queue without counting the attempt."""
+        job.status = QUEUED
+        job.attempts -= 1
+        job.started_at = None
+        self._running[job.account_id] -= 1
+        self._queued.appendleft(job.id)
+
+    async def prune(self):
+        cutoff = utc_now() - timedelta(seconds=settings.JOB_RETENTION_SECONDS)
+        for job_id in [job.id for job in self._jobs.values()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+# Claims the oldest job that is queued, or running past its lease, of an
+# account with fewer than :max_running jobs running within their lease.
+# SKIP LOCKED lets concurrent workers claim different jobs without waiting
+# on each other. The running limit is checked without locking the
+# account's other jobs, so concurrent claims may briefly exceed it.
+_CLAIM_SQL = text("""
+    UPDATE jobs SET status = 'running', started_at = now(), attempts = attempts + 1
+    WHERE id = (
+        SELECT candidate.id FROM jobs AS candidate
+        WHERE (candidate.status = 'queued'
+               OR (candidate.status = 'running' AND candidate.started_at < now() - :lease))
+          AND candidate.attempts < :max_attempts
+          AND (
+              SELECT count(*) FROM jobs AS running
+              WHERE running.account_id = candidate.account_id
+                AND running.status = 'running'
+                AND running.started_at >= now() - :lease
+          ) < :max_running
+        ORDER BY candidate.id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+""").bindparams(bindparam("lease", type_=Interval()))
+
+
+class DatabaseJobQueue(_JobQueue):
+    """
+    Keeps jobs in the `jobs` table, so they survive restarts and are
+    consumed by the workers of every process. Idle workers poll every
+    JOB_POLL_INTERVAL seconds, or wake up right away for jobs submitted in
+    their own process.
+    """
+
+    async def submit(self, db: AsyncSession, account_id: int, kind: str,
+                     params: Dict[str, Any], observations: Optional[np.ndarray] = None) -> JobInfo:
+        unfinished = await db.scalar(
+            select(func.count()).select_from(Job).where(
+                Job.account_id == account_id, Job.status.in_(_UNFINISHED)))
+        if unfinished >= settings.JOB_MAX_QUEUED_PER_ACCOUNT:
+            raise JobLimitError("Too many unfinished jobs, please retry later")
+
+        job = Job(account_id=account_id, kind=kind, status=QUEUED, params=params,
+                  observations=observations, attempts=0)
+        db.add(job)
+        await db.commit()
+        self.notify()
+        return JobInfo.from_job(job)
+
+    async def get(self, db: AsyncSession, account_id: int, job_id: int) -> Optional[JobInfo]:
+        result = await db.execute(
+            select(Job).where(Job.id == job_id, Job.account_id == account_id))
+        job = result.scalar_one_or_none()
+        return JobInfo.from_job(job) if job is not None else None
+
+    async def claim(self) -> Optional[JobInfo]:
+        async with AsyncSessionLocal() as db:
+            job_id = (await db.execute(_CLAIM_SQL, {
+                "lease": timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                "max_attempts": settings.JOB_MAX_ATTEMPTS,
+                "max_running": settings.JOB_MAX_RUNNING_PER_ACCOUNT,
+            })).scalar_one_or_none()
+            if job_id is None:
+                await db.rollback()
+                return None
+
+            job = await db.get(Job, job_id)
+            await db.commit()
+            return JobInfo.from_job(job)
+
+    async def _finish(self, job: JobInfo, **values):
+        # Only the worker holding the current attempt may finish the job;
+        # a worker whose lease expired and was reclaimed writes nothing
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == RUNNING, Job.attempts == job.attempts)
+                .values(**values)
+            )
+            await db.commit()
+        self.notify()
+
+    async def complete(self, job: JobInfo, result: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        await self._finish(job, status=SUCCEEDED, result=result,
+                           result_arrays=pack_named_arrays(arrays), finished_at=utc_now())
+
+    async def fail(self, job: JobInfo, error: str):
+        await self._finish(job, status=FAILED, error=error, finished_at=utc_now())
+
+    async def release(self, job: JobInfo):
+        await self._finish(job, status=QUEUED, started_at=None, attempts=Job.attempts - 1)
+
+    async def prune(self):
+        lease_start = func.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            # Jobs whose workers died on every attempt
+            await db.execute(
+                update(Job)
+                .where(Job.status == RUNNING, Job.attempts >= settings.JOB_MAX_ATTEMPTS,
+                       Job.started_at < lease_start)
+                .values(status=FAILED, error="Job did not finish within its lease",
+                        finished_at=utc_now())
+            )
+            await db.execute(
+                delete(Job).where(
+                    Job.status.in_((SUCCEEDED, FAILED)),
+                    Job.finished_at < utc_now() - timedelta(seconds=settings.JOB_RETENTION_SECONDS))
+            )
+            await db.commit()
+
+
+def get_job_queue():
+    """Return the process-wide job queue selected by JOB_QUEUE_BACKEND."""
+    global _queue
+
+    if _queue is None:
+        if settings.JOB_QUEUE_BACKEND == "database":
+            _queue = DatabaseJobQueue()
+        else:
+            _queue = InMemoryJobQueue()
+    return _queue
+
+
+async def _run_job(queue, job: JobInfo):
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        result, arrays = await handler(job)
+    except ExecutorSaturatedError:
+        await queue.release(job)
+        await asyncio.sleep(_SATURATED_BACKOFF)
+        return
+    except ValueError as e:
+        await queue.fail(job, str(e))
+        return
+    except Exception as e:
+        logger.exception("Job %d (%s) failed", job.id, job.kind)
+        await queue.fail(job, str(e))
+        return
+    await queue.complete(job, result, arrays)
+
+
+async def _worker_loop():
+    queue = get_job_queue()
+    while True:
+        try:
+            job = await queue.claim()
+            if job is None:
+                await queue.maybe_prune()
+                await queue.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            await _run_job(queue, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Job worker iteration failed")
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+
+def start_job_workers():
+    """Start JOB_WORKERS job consumers on the event loop."""
+    if _worker_tasks:
+        return
+    for _ in range(settings.JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_worker_loop()))
+
+
+async def stop_job_workers():
+    """
+    Stop the consumers. Jobs they were running stay claimed; the database
+    backend hands them to another worker once their lease expires.
+    """
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
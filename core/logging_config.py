@@ -0,0 +1,96 @@
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from .config import settings
+
+SQL_LOGGER_NAME = "sqlalchemy.engine"
+
+_listener: Optional[QueueListener] = None
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update({
+            key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        })
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SqlSamplingFilter(logging.Filter):
+    """Keeps only a random fraction of the SQL statements SQLAlchemy logs."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.name.startswith(SQL_LOGGER_NAME):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging():
+    """
+    Route all logging through a queue so request handlers never block on
+    console I/O; a background listener thread does the formatting and
+    writing.
+
+    Configured from Settings: LOG_LEVEL for the root logger, LOG_LEVELS for
+    per-logger overrides, LOG_JSON for JSON lines output, and LOG_SQL /
+    LOG_SQL_SAMPLE_RATE for sampled SQL statement logging.
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        JsonFormatter() if settings.LOG_JSON else
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SqlSamplingFilter(settings.LOG_SQL_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    logging.getLogger(SQL_LOGGER_NAME).setLevel(
+        logging.INFO if settings.LOG_SQL else logging.WARNING)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(
+        log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
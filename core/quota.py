@@ -0,0 +1,340 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.account import Account
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+_sync_task: Optional[asyncio.Task] = None
+_invalidations = set()
+
+
+async def _read_quota(account_id: int, db: AsyncSession) -> Optional[int]:
+    result = await db.execute(select(Account.quota).where(Account.id == account_id))
+    return result.scalar_one_or_none()
+
+
+async def _read_quotas(account_ids: List[int], db: AsyncSession) -> Dict[int, int]:
+    result = await db.execute(
+        select(Account.id, Account.quota).where(Account.id.in_(account_ids)))
+    return dict(result.all())
+
+
+async def _apply_delta(account_id: int, delta: int, db: AsyncSession):
+    # Raw SQL so updated_at is left untouched, as in DatabaseQuotaBackend
+    await db.execute(
+        text("UPDATE accounts SET quota = quota - :delta WHERE id = :account_id"),
+        {"delta": delta, "account_id": account_id})
+
+
+class DatabaseQuotaBackend:
+    """
+    Decrements `accounts.quota` directly with one conditional UPDATE,
+    committed straight away. Always exact, but serialises concurrent
+    requests of the same account on one row for the length of that
+    statement.
+    """
+
+    async def consume(self, account_id: int, db: AsyncSession, amount: int = 1) -> bool:
+        # Check and decrement in one statement, so the row is locked only
+        # until the commit below rather than for the rest of the request.
+        # Raw SQL updates only the quota column without triggering updated_at
+        raw_sql = text(
+            "UPDATE accounts SET quota = quota - :amount "
+            "WHERE id = :account_id AND quota >= :amount RETURNING quota")
+        result = await db.execute(raw_sql, {"amount": amount, "account_id": account_id})
+        charged = result.scalar_one_or_none() is not None
+
+        # Commit the changes; a request failing later stays charged, as with
+        # the cached backends
+        await db.commit()
+
+        return charged
+
+    async def flush(self):
+        pass
+
+    async def invalidate(self, account_id: int):
+        pass
+
+
+class InMemoryQuotaBackend:
+    """
+    Keeps remaining quota per account in process memory and records the
+    consumed delta, which `flush` writes back to `accounts.quota`. Every
+    flush then resets the cached counters to `accounts.quota` minus the
+    deltas still pending, so top-ups show up within one sync interval.
+
+    Every worker process has its own counters, so this is meant for single
+    worker deployments and running without Redis.
+    """
+
+    def __init__(self):
+        self._remaining: Dict[int, int] = {}
+        self._deltas: Dict[int, int] = {}
+
+    async def consume(self, account_id: int, db: AsyncSession, amount: int = 1) -> bool:
+        if account_id not in self._remaining:
+            quota = await _read_quota(account_id, db)
+            if quota is None:
+                return False
+            # Another request may have loaded it while we were awaiting;
+            # deltas that failed to flush aren't in accounts.quota yet
+            self._remaining.setdefault(account_id, quota - self._deltas.get(account_id, 0))
+
+        # No await between check and decrement, so this is atomic on the loop
+        if self._remaining[account_id] < amount:
+            return False
+        self._remaining[account_id] -= amount
+        self._deltas[account_id] = self._deltas.get(account_id, 0) + amount
+        return True
+
+    async def flush(self):
+        deltas, self._deltas = self._deltas, {}
+        account_ids = list(self._remaining)
+        if not deltas and not account_ids:
+            return
+
+        async with AsyncSessionLocal() as db:
+            try:
+                for account_id, delta in deltas.items():
+                    await _apply_delta(account_id, delta, db)
+                await db.commit()
+            except Exception:
+                # Keep the deltas for the next sync; once committed they
+                # must not be restored, or they would be charged twice
+                for account_id, delta in deltas.items():
+                    self._deltas[account_id] = self._deltas.get(account_id, 0) + delta
+                raise
+            quotas = await _read_quotas(account_ids, db) if account_ids else {}
+
+        # accounts.quota now includes the flushed deltas; whatever was
+        # consumed while we were awaiting is still pending in self._deltas
+        for account_id in account_ids:
+            if account_id in quotas:
+                self._remaining[account_id] = quotas[account_id] - self._deltas.get(account_id, 0)
+            else:
+                self._remaining.pop(account_id, None)
+
+    async def invalidate(self, account_id: int):
+        """Flush and drop the cached counter, e.g. after a quota top-up."""
+        await self.flush()
+        self._remaining.pop(account_id, None)
+
+
+# KEYS: remaining, delta, dirty set; ARGV: amount, account id.
+# Returns nil when the counter isn't loaded, -1 when quota is exhausted,
+# and the remaining quota otherwise.
+_CONSUME_SCRIPT = """
+local remaining = redis.call('GET', KEYS[1])
+if not remaining then
+    return nil
+end
+if tonumber(remaining) < tonumber(ARGV[1]) then
+    return -1
+end
+remaining = redis.call('DECRBY', KEYS[1], ARGV[1])
+redis.call('INCRBY', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[2])
+return remaining
+"""
+
+# KEYS: remaining, delta, flushing; ARGV: quota read from the database,
+# expiry in ms. Loads the counter as the quota minus the deltas not yet
+# committed to it, unless another worker loaded it in the meantime
+_LOAD_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[2]) or '0') +
+    tonumber(redis.call('GET', KEYS[3]) or '0')
+redis.call('SET', KEYS[1], tonumber(ARGV[1]) - pending, 'PX', ARGV[2], 'NX')
+"""
+
+# KEYS: delta, flushing. Moves the delta to the flushing key, where it stays
+# pending until the database commit. Returns the delta, nil when there is
+# none, and -1 when another worker is still flushing the account
+_TAKE_DELTA_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return -1
+end
+local delta = redis.call('GET', KEYS[1])
+if not delta then
+    return nil
+end
+redis.call('SET', KEYS[2], delta)
+redis.call('DEL', KEYS[1])
+return tonumber(delta)
+"""
+
+# KEYS: delta, flushing, dirty set; ARGV: account id. Puts a delta that
+# failed to flush back for the next sync
+_RESTORE_DELTA_SCRIPT = """
+local delta = redis.call('GET', KEYS[2])
+if delta then
+    redis.call('INCRBY', KEYS[1], delta)
+    redis.call('DEL', KEYS[2])
+end
+redis.call('SADD', KEYS[3], ARGV[1])
+"""
+
+
+class RedisQuotaBackend:
+    """
+    Keeps remaining quota in Redis (`user:{id}:quota`) and the consumed delta
+    in `user:{id}:quota_delta`, following the delta-based synchronisation in
+    SPEC.md; a delta being written to the database is kept in
+    `user:{id}:quota_flushing` until it is committed. Decrements are atomic Lua scripts, so the counter is shared by
+    all workers. The counter expires after QUOTA_SYNC_INTERVAL and is
+    reloaded from `accounts.quota` on the next request, so top-ups show up
+    without an explicit `invalidate`.
+    """
+
+    DIRTY_KEY = "quota:dirty"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "QUOTA_BACKEND=redis requires the 'redis' package")
+
+        self._redis = redis.from_url(url)
+        self._consume = self._redis.register_script(_CONSUME_SCRIPT)
+        self._load = self._redis.register_script(_LOAD_SCRIPT)
+        self._take_delta = self._redis.register_script(_TAKE_DELTA_SCRIPT)
+        self._restore_delta = self._redis.register_script(_RESTORE_DELTA_SCRIPT)
+        self._ttl_ms = max(int(settings.QUOTA_SYNC_INTERVAL * 1000), 1)
+
+    @staticmethod
+    def _quota_key(account_id: int) -> str:
+        return f"user:{account_id}:quota"
+
+    @staticmethod
+    def _delta_key(account_id: int) -> str:
+        return f"user:{account_id}:quota_delta"
+
+    @staticmethod
+    def _flushing_key(account_id: int) -> str:
+        return f"user:{account_id}:quota_flushing"
+
+    async def consume(self, account_id: int, db: AsyncSession, amount: int = 1) -> bool:
+        keys = [self._quota_key(account_id), self._delta_key(account_id), self.DIRTY_KEY]
+        remaining = await self._consume(keys=keys, args=[amount, account_id])
+
+        if remaining is None:
+            quota = await _read_quota(account_id, db)
+            if quota is None:
+                return False
+            await self._load(
+                keys=keys[:2] + [self._flushing_key(account_id)], args=[quota, self._ttl_ms])
+            remaining = await self._consume(keys=keys, args=[amount, account_id])
+
+        return remaining is not None and remaining >= 0
+
+    async def flush(self):
+        account_ids = await self._redis.smembers(self.DIRTY_KEY)
+        if not account_ids:
+            return
+
+        async with AsyncSessionLocal() as db:
+            for raw_id in account_ids:
+                account_id = int(raw_id)
+                delta_keys = [self._delta_key(account_id), self._flushing_key(account_id)]
+                await self._redis.srem(self.DIRTY_KEY, raw_id)
+                delta = await self._take_delta(keys=delta_keys)
+                if delta is None:
+                    continue
+                if delta < 0:
+                    # Another worker is flushing it; leave the rest for later
+                    await self._redis.sadd(self.DIRTY_KEY, account_id)
+                    continue
+                try:
+                    await _apply_delta(account_id, delta, db)
+                    await db.commit()
+                except Exception:
+                    # Put the delta back for the next sync
+                    await db.rollback()
+                    await self._restore_delta(
+                        keys=delta_keys + [self.DIRTY_KEY], args=[account_id])
+                    raise
+                await self._redis.delete(self._flushing_key(account_id))
+
+    async def invalidate(self, account_id: int):
+        """Flush and drop the cached counter, e.g. after a quota top-up."""
+        await self.flush()
+        await self._redis.delete(self._quota_key(account_id))
+
+
+def get_quota_backend():
+    """Return the process-wide quota backend selected by QUOTA_BACKEND."""
+    global _backend
+
+    if _backend is None:
+        if settings.QUOTA_BACKEND == "memory":
+            _backend = InMemoryQuotaBackend()
+        elif settings.QUOTA_BACKEND == "redis":
+            if not settings.REDIS_URL:
+                raise RuntimeError("QUOTA_BACKEND=redis requires REDIS_URL")
+            _backend = RedisQuotaBackend(settings.REDIS_URL)
+        else:
+            _backend = DatabaseQuotaBackend()
+    return _backend
+
+
+async def _invalidate_quietly(account_id: int):
+    try:
+        await get_quota_backend().invalidate(account_id)
+    except Exception:
+        logger.exception("Quota invalidation of account %s failed", account_id)
+
+
+# Drop the cached counter when accounts.quota is changed through the ORM, e.g.
+# by a top-up. This runs before the change is committed, so a request in
+# between may still reload the old value; the next sync corrects it. Raw SQL
+# updates bypass the event, the decrements above included.
+@event.listens_for(Account, "after_update")
+def _invalidate_on_quota_update(mapper, connection, target: Account):
+    if not inspect(target).attrs.quota.history.has_changes():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(_invalidate_quietly(target.id))
+    _invalidations.add(task)
+    task.add_done_callback(_invalidations.discard)
+
+
+async def _sync_loop():
+    while True:
+        await asyncio.sleep(settings.QUOTA_SYNC_INTERVAL)
+        try:
+            await get_quota_backend().flush()
+        except Exception:
+            logger.exception("Quota sync failed")
+
+
+def start_quota_sync():
+    """Start periodically flushing cached quota deltas to the database."""
+    global _sync_task
+
+    if settings.QUOTA_BACKEND == "database" or _sync_task is not None:
+        return
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop_quota_sync():
+    """Stop the sync task and flush the remaining deltas."""
+    global _sync_task
+
+    if _sync_task is None:
+        return
+    _sync_task.cancel()
+    _sync_task = None
+    try:
+        await get_quota_backend().flush()
+    except Exception:
+        logger.exception("Final quota sync failed")
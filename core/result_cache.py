@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from models.types import pack_array, unpack_array_from
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+
+# Arrays of a cached result, in the order they are packed for the shared backend
+_RESULT_ARRAYS = ("filtered_data", "raw_state", "smooth_state")
+# Packed after those for results computed with diagnostics
+_DIAGNOSTIC_ARRAYS = ("log_likelihood", "normalized_innovations")
+
+
+def cache_key(namespace: str, *arrays) -> str:
+    """
+    Content address of a computation: a hash of the namespace and the dtype,
+    shape and bytes of every input array.
+    """
+    digest = hashlib.blake2b(namespace.encode(), digest_size=20)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.data)
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+def _result_size(result: Dict[str, Any]) -> int:
+    return sum(value.nbytes for value in result.values() if isinstance(value, np.ndarray))
+
+
+def _pack_result(result: Dict[str, Any]) -> bytes:
+    names = _RESULT_ARRAYS + (_DIAGNOSTIC_ARRAYS if "log_likelihood" in result else ())
+    return struct.pack("<Q", result["data_count"]) + b"".join(
+        pack_array(result[name]) for name in names)
+
+
+def _unpack_result(buffer: bytes) -> Dict[str, Any]:
+    result = {"data_count": struct.unpack_from("<Q", buffer)[0]}
+    offset = 8
+    for name in _RESULT_ARRAYS:
+        result[name], offset = unpack_array_from(buffer, offset)
+    if offset < len(buffer):
+        for name in _DIAGNOSTIC_ARRAYS:
+            result[name], offset = unpack_array_from(buffer, offset)
+        result["total_log_likelihood"] = float(result["log_likelihood"].sum())
+    return result
+
+
+class ResultCache:
+    """
+    In-process LRU cache of Kalman results bounded by the total size of the
+    cached arrays, whose entries expire after `ttl` seconds. Only accessed
+    from the event loop, so no locking.
+
+    Cached arrays are made read-only, since the same arrays are handed to
+    every request that hits the entry.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, size, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.bytes -= size
+            self._metrics["expirations"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return result
+
+    def _set_local(self, key: str, result: Dict[str, Any]):
+        size = _result_size(result)
+        if self.ttl <= 0 or size > self.max_bytes:
+            return
+
+        for value in result.values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._entries[key] = (time.monotonic() + self.ttl, size, result)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self._metrics["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._get_local(key)
+        if result is None:
+            self._metrics["misses"] += 1
+        else:
+            self._metrics["hits"] += 1
+        return result
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        self._set_local(key, result)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "hit_ratio": self._metrics["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class RedisResultCache(ResultCache):
+    """
+    `ResultCache` backed by Redis, so results are shared between workers.
+
+    The in-process LRU stays in front of Redis; entries found in Redis are
+    copied into it. Redis errors are logged and treated as misses, so an
+    unavailable cache never fails a request.
+    """
+
+    def __init__(self, url: str, ttl: float, max_bytes: int):
+        super().__init__(ttl=ttl, max_bytes=max_bytes)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "RESULT_CACHE_BACKEND=redis requires the 'redis' package")
+
+        self._redis = redis.from_url(url)
+        self._metrics["shared_hits"] = 0
+        self._metrics["shared_errors"] = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._get_local(key)
+        if result is not None:
+            self._metrics["hits"] += 1
+            return result
+
+        try:
+            buffer = await self._redis.get(key)
+        except Exception:
+            logger.warning("Shared result cache lookup failed", exc_info=True)
+            self._metrics["shared_errors"] += 1
+            buffer = None
+
+        if buffer is None:
+            self._metrics["misses"] += 1
+            return None
+
+        result = _unpack_result(buffer)
+        self._metrics["hits"] += 1
+        self._metrics["shared_hits"] += 1
+        self._set_local(key, result)
+        return result
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        self._set_local(key, result)
+        if self.ttl <= 0:
+            return
+        try:
+            await self._redis.set(key, _pack_result(result), px=int(self.ttl * 1000))
+        except Exception:
+            logger.warning("Shared result cache store failed", exc_info=True)
+            self._metrics["shared_errors"] += 1
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Return the process-wide result cache selected by RESULT_CACHE_BACKEND,
+    or None when caching is disabled.
+    """
+    global _cache
+
+    if settings.RESULT_CACHE_BACKEND == "none":
+        return None
+
+    if _cache is None:
+        if settings.RESULT_CACHE_BACKEND == "redis":
+            if not settings.REDIS_URL:
+                raise RuntimeError("RESULT_CACHE_BACKEND=redis requires REDIS_URL")
+            _cache = RedisResultCache(
+                settings.REDIS_URL, ttl=settings.RESULT_CACHE_TTL,
+                max_bytes=settings.RESULT_CACHE_MAX_BYTES)
+        else:
+            _cache = ResultCache(
+                ttl=settings.RESULT_CACHE_TTL,
+                max_bytes=settings.RESULT_CACHE_MAX_BYTES)
+    return _cache
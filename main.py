@@ -1,17 +1,32 @@
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from core.config import settings
-from api.routes import health, kalman
+from core.executor import start_executor, shutdown_executor
+from core.jobs import start_job_workers, stop_job_workers
+from core.logging_config import configure_logging, shutdown_logging
+from core.quota import start_quota_sync, stop_quota_sync
+from api.routes import health, jobs, kalman, models, panas
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("Starting up...")
+    logger.info("Starting up...")
+    start_executor()
+    start_quota_sync()
+    start_job_workers()
     yield
     # Shutdown
-    print("Shutting down...")
+    logger.info("Shutting down...")
+    await stop_job_workers()
+    await stop_quota_sync()
+    shutdown_executor()
+    shutdown_logging()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -33,3 +48,6 @@ if settings.BACKEND_CORS_ORIGINS:
 # Include routers
 app.include_router(health.router, prefix=settings.API_V1_PREFIX)
 app.include_router(kalman.router, prefix=settings.API_V1_PREFIX)
+app.include_router(panas.router, prefix=settings.API_V1_PREFIX)
+app.include_router(models.router, prefix=settings.API_V1_PREFIX)
+app.include_router(jobs.router, prefix=settings.API_V1_PREFIX)
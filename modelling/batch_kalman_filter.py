@@ -0,0 +1,337 @@
+import numpy as np
+from scipy.signal import lfilter
+from modelling.kalman_filter import information_matrices, observation_masks
+from modelling.steady_state import STEADY_STATE_RTOL, get_steady_state
+
+# Shortest run of weeks worth filtering as one steady-state block
+_MIN_STEADY_BLOCK = 4
+
+
+class BatchKalmanFilter(object):
+    """
+    Kalman filter and RTS smoother for many independent series that share the
+    same model.
+
+    Every operation works on arrays stacked over a leading series axis, so a
+    cohort of N series is filtered with one vectorised pass per week instead
+    of N Python loops. Series may have different lengths; steps past the end
+    of a series leave its state untouched. Missing items are NaN: weeks with
+    nothing observed skip the measurement update, and partially observed
+    weeks are updated with H and R restricted to the observed items, with
+    series sharing a pattern of missing items updated together. Series whose
+    covariance has converged are updated with the cached steady-state gain
+    on fully observed weeks; once every active series has converged, runs
+    of fully observed weeks are filtered as one fixed-gain recurrence.
+    """
+
+    def __init__(self, F=None, B=None, H=None, Q=None, R=None, P=None, x0=None,
+                 steady_state=True, model=None):
+
+        # See KalmanFilter: a compiled model supplies the matrices and shares
+        # its derived artifacts
+        if model is not None:
+            F, H, Q, R = model.F, model.H, model.Q, model.R
+            P = model.P0 if P is None else P
+            x0 = model.x0 if x0 is None else x0
+        self.model = model
+
+        if F is None or H is None:
+            raise ValueError("Set proper system dynamics.")
+
+        self.n = F.shape[1]
+        self.m = H.shape[0]
+
+        self.F = F
+        self.H = H
+        self.B = 0 if B is None else B
+        self.Q = np.eye(self.n) if Q is None else Q
+        self.R = np.eye(self.m) if R is None else R
+        self.P0 = np.eye(self.n) if P is None else P
+        self.x0 = np.zeros((self.n, 1)) if x0 is None else x0
+
+        # Information-form update when the state is smaller than the
+        # observation vector, see InformationKalmanFilter
+        self.use_information_form = self.n < self.m
+        if self.use_information_form:
+            self.HtRinv, self.HtRinvH = self._artifact(
+                "information", lambda: information_matrices(self.H, self.R))
+
+        if not steady_state:
+            self.steady_state = None
+        elif model is not None:
+            self.steady_state = model.steady_state
+        else:
+            self.steady_state = get_steady_state(self.F, self.H, self.Q, self.R)
+
+    def _artifact(self, name, build):
+        """Call `build()`, or share its result through the compiled model."""
+        if self.model is None:
+            return build()
+        return self.model.artifact(name, build)
+
+    def _restricted_model(self, mask, observed):
+        if self.model is None:
+            return self._observation_model(observed)
+        return self.model.observation_model(
+            type(self).__name__, mask, lambda: self._observation_model(observed))
+
+    def _is_steady(self, covs):
+        # covs: (N, n, n) -> (N,) mask of converged covariances
+        if self.steady_state is None:
+            return np.zeros(len(covs), dtype=bool)
+        return np.all(np.abs(covs - self.steady_state.P) <=
+                      STEADY_STATE_RTOL * np.abs(self.steady_state.P), axis=(1, 2))
+
+    def predict(self, x, P):
+        x = self.F @ x + self.B
+        P = self.F @ P @ self.F.T + self.Q
+        return x, P
+
+    def _observation_model(self, observed):
+        """
+        Measurement model restricted to the `observed` item indices, in the
+        form `_update` expects.
+        """
+        H = self.H[observed]
+        R = self.R[np.ix_(observed, observed)]
+        if self.use_information_form:
+            return (H, R) + information_matrices(H, R)
+        return H, R, None, None
+
+    def _update(self, x, P, z, model):
+        # x: (N, n, 1), P: (N, n, n), z: (N, k, 1) for a model over k items
+        H, R, HtRinv, HtRinvH = model
+        if self.use_information_form:
+            P = np.linalg.solve(np.eye(self.n) + P @ HtRinvH, P)
+            x = x + P @ (HtRinv @ (z - H @ x))
+            return x, P
+
+        HP = H @ P
+        S = R + HP @ H.T
+        # S is symmetric, so K = P H^T S^-1 = (S^-1 H P)^T
+        K = np.swapaxes(np.linalg.solve(S, HP), -1, -2)
+        x = x + K @ (z - H @ x)
+        I_KH = np.eye(self.n) - K @ H
+        P = I_KH @ P @ np.swapaxes(I_KH, -1, -2) + \
+            K @ R @ np.swapaxes(K, -1, -2)
+        return x, P
+
+    def update(self, x, P, z):
+        # x: (N, n, 1), P: (N, n, n), z: (N, m, 1)
+        if self.use_information_form:
+            return self._update(x, P, z, (self.H, self.R, self.HtRinv, self.HtRinvH))
+        return self._update(x, P, z, (self.H, self.R, None, None))
+
+    def forward(self, observations, lengths=None, filtered=False):
+        """
+        Run the forward algorithm on a stack of observation series.
+
+        Args:
+            observations: Array of shape (N, T, m); shorter series are padded
+            lengths: Number of valid weeks per series, defaults to T for all
+            filtered: Also return the moments after each week's measurement
+                      update, e.g. for `smooth` to run the RTS recursion
+                      over them
+
+        Returns:
+            tuple: (states (N, T + 1, n, 1), covariances (N, T + 1, n, n),
+                    predicted observations (N, T, m, 1)), and with
+                   `filtered` also (filtered states (N, T, n, 1), filtered
+                   covariances (N, T, n, n)); entries past the end of a
+                   series are unspecified
+        """
+        observations = np.asarray(observations, dtype=float)
+        N, T, _ = observations.shape
+        lengths = np.full(N, T) if lengths is None else np.asarray(lengths)
+
+        states = np.empty((N, T + 1, self.n, 1))
+        covs = np.empty((N, T + 1, self.n, self.n))
+
+        x = np.broadcast_to(self.x0, (N, self.n, 1)).astype(float)
+        P = np.broadcast_to(self.P0, (N, self.n, self.n)).astype(float)
+        states[:, 0] = x
+        covs[:, 0] = P
+        if filtered:
+            filtered_states = np.empty((N, T, self.n, 1))
+            filtered_covs = np.empty((N, T, self.n, self.n))
+
+        # Group every (series, week) by its pattern of missing items once,
+        # and build the restricted model of each partial pattern up front
+        groups, masks = observation_masks(observations.reshape(N * T, self.m))
+        groups = groups.reshape(N, T)
+        n_observed = masks.sum(axis=1)
+        is_full = n_observed[groups] == self.m
+        is_partial = (n_observed[groups] > 0) & ~is_full
+        partial_models = {
+            group: (observed, self._restricted_model(masks[group], observed))
+            for group, observed in enumerate(np.flatnonzero(mask) for mask in masks)
+            if 0 < len(observed) < self.m
+        }
+
+        # First week at or after each week that is not fully observed, per
+        # series; weeks past the end of a series don't interrupt a run
+        week = np.arange(T)
+        is_gap = ~is_full & (week < lengths[:, None])
+        next_gap = np.minimum.accumulate(
+            np.where(is_gap, week, T)[:, ::-1], axis=1)[:, ::-1]
+
+        t = 0
+        while t < T:
+            is_active = t < lengths
+            if not is_active.any():
+                states[:, t + 1:] = x[:, None]
+                covs[:, t + 1:] = P[:, None]
+                if filtered:
+                    filtered_states[:, t:] = x[:, None]
+                    filtered_covs[:, t:] = P[:, None]
+                break
+
+            if self.steady_state is not None and self._is_steady(P[is_active]).all():
+                end = int(next_gap[is_active, t].min())
+                if end - t >= _MIN_STEADY_BLOCK:
+                    self._steady_block(observations, lengths, t, end, x, states, covs)
+                    if filtered:
+                        self._steady_block_filtered(
+                            observations, t, end, states, filtered_states, filtered_covs)
+                    x = states[:, end].copy()
+                    P = covs[:, end].copy()
+                    t = end
+                    continue
+
+            z = observations[:, t].reshape(N, self.m, 1)
+
+            do_update = is_active & is_full[:, t]
+            is_steady = self._is_steady(P)
+
+            # Converged series: fixed gain, covariance stays at steady state
+            fast_update = do_update & is_steady
+            if fast_update.any():
+                x[fast_update] = x[fast_update] + self.steady_state.K @ (
+                    z[fast_update] - self.H @ x[fast_update])
+
+            full_update = do_update & ~is_steady
+            if full_update.any():
+                x_upd, P_upd = self.update(
+                    x[full_update], P[full_update], z[full_update])
+                x[full_update] = x_upd
+                P[full_update] = P_upd
+
+            partial_update = is_active & is_partial[:, t]
+            for group in np.unique(groups[partial_update, t]):
+                observed, model = partial_models[group]
+                selected = partial_update & (groups[:, t] == group)
+                x[selected], P[selected] = self._update(
+                    x[selected], P[selected],
+                    z[selected][:, observed], model)
+
+            if filtered:
+                filtered_states[:, t] = x
+                filtered_covs[:, t] = P
+                if fast_update.any():
+                    filtered_covs[fast_update, t] = self.steady_state.P_post
+
+            x_pred, P_pred = self.predict(x, P)
+            if fast_update.any():
+                P_pred[fast_update] = self.steady_state.P
+            x = np.where(is_active[:, None, None], x_pred, x)
+            P = np.where(is_active[:, None, None], P_pred, P)
+
+            states[:, t + 1] = x
+            covs[:, t + 1] = P
+            t += 1
+
+        if filtered:
+            return states, covs, self.H @ states[:, 1:], filtered_states, filtered_covs
+        return states, covs, self.H @ states[:, 1:]
+
+    def _steady_block(self, observations, lengths, start, end, x, states, covs):
+        """
+        Filter weeks start..end - 1, fully observed by every active series
+        that has converged, as the fixed-gain recurrence
+        x_t = F (I - K H) x_{t-1} + F K z_t + B, writing into `states` and
+        `covs`. For a scalar state all series run through one `lfilter`
+        call; series that end inside the block keep their last state.
+        """
+        steady_state = self.steady_state
+        # Padding past the end of a series is NaN and is overwritten below
+        z = np.nan_to_num(observations[:, start:end])
+        inputs = z @ (self.F @ steady_state.K).T + np.reshape(self.B, -1)
+
+        if self.n == 1:
+            a = steady_state.A[0, 0]
+            block, _ = lfilter([1.0], [1.0, -a], inputs[:, :, 0], axis=1,
+                               zi=a * x[:, 0])
+            states[:, start + 1:end + 1] = block[:, :, None, None]
+        else:
+            for t in range(start, end):
+                x = steady_state.A @ x + inputs[:, t - start, :, None]
+                states[:, t + 1] = x
+        covs[:, start + 1:end + 1] = steady_state.P
+
+        for i in np.flatnonzero(lengths < end):
+            last = max(lengths[i], start)
+            states[i, last + 1:end + 1] = states[i, last]
+            covs[i, last + 1:end + 1] = covs[i, last]
+
+    def _steady_block_filtered(self, observations, start, end, states,
+                               filtered_states, filtered_covs):
+        """
+        Filtered moments of the weeks of a `_steady_block`, from the
+        predicted states it wrote and the converged gain.
+        """
+        z = np.nan_to_num(observations[:, start:end])[..., None]
+        priors = states[:, start:end]
+        filtered_states[:, start:end] = priors + self.steady_state.K @ (z - self.H @ priors)
+        filtered_covs[:, start:end] = self.steady_state.P_post
+
+    def smooth(self, states, covs, lengths=None, lag_one=False):
+        """
+        Run the RTS smoother over the outputs of `forward`, or over its
+        filtered moments, with `lengths` one less than the number of weeks.
+
+        Args:
+            lag_one: Also return the lag-one covariances
+                     Cov(x_k+1, x_k | all steps), as EM needs them
+
+        Returns:
+            tuple: (smoothed states (N, T + 1, n, 1),
+                    smoothed covariances (N, T + 1, n, n)), and with
+                   `lag_one` also the lag-one covariances (N, T + 1, n, n),
+                   set for steps before the last valid one
+        """
+        N, T1, _, _ = states.shape
+        lengths = np.full(N, T1 - 1) if lengths is None else np.asarray(lengths)
+
+        # Entries from the last valid step onwards are their own smoothed value
+        x_smooth = states.copy()
+        P_smooth = covs.copy()
+        if lag_one:
+            cross = np.zeros_like(covs)
+
+        for k in range(T1 - 2, -1, -1):
+            is_active = (k < lengths)[:, None, None]
+            P_k = covs[:, k]
+            P_pred = self.F @ P_k @ self.F.T + self.Q
+            K = np.empty((N, self.n, self.n))
+
+            # Converged steps reuse the cached smoother gain
+            is_steady = self._is_steady(P_k)
+            if is_steady.any():
+                K[is_steady] = self.steady_state.smoother_gain
+                P_pred[is_steady] = self.steady_state.smoother_P_pred
+
+            # P_pred is symmetric, so P_k F^T P_pred^-1 = (P_pred^-1 F P_k)^T
+            if not is_steady.all():
+                K[~is_steady] = np.swapaxes(np.linalg.solve(
+                    P_pred[~is_steady], self.F @ P_k[~is_steady]), -1, -2)
+            x_k = states[:, k] + K @ (x_smooth[:, k + 1] - self.F @ states[:, k])
+            P_k = P_k + K @ (P_smooth[:, k + 1] - P_pred) @ np.swapaxes(K, -1, -2)
+            x_smooth[:, k] = np.where(is_active, x_k, x_smooth[:, k])
+            P_smooth[:, k] = np.where(is_active, P_k, P_smooth[:, k])
+            if lag_one:
+                cross[:, k] = np.where(
+                    is_active, P_smooth[:, k + 1] @ np.swapaxes(K, -1, -2), 0)
+
+        if lag_one:
+            return x_smooth, P_smooth, cross
+        return x_smooth, P_smooth
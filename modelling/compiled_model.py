@@ -0,0 +1,165 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from modelling.steady_state import get_steady_state
+
+# Measurement models restricted to a pattern of missing items kept per
+# model and filter type
+_MAX_OBSERVATION_MODELS = 256
+
+# Models unpickled in a process worker, with their artifacts, kept by key
+_MAX_PROCESS_MODELS = 32
+_process_models = OrderedDict()
+_process_models_lock = threading.Lock()
+
+
+def model_key(F, H, Q, R, x0, P0) -> str:
+    """Content hash of the matrices of a model."""
+    digest = hashlib.blake2b(digest_size=20)
+    for matrix in (F, H, Q, R, x0, P0):
+        matrix = np.ascontiguousarray(matrix, dtype=float)
+        digest.update(str(matrix.shape).encode())
+        digest.update(matrix.data)
+    return digest.hexdigest()
+
+
+def _matrix(value, name, shape):
+    matrix = np.array(value, dtype=float)
+    if matrix.shape != shape:
+        raise ValueError(f"{name} must have shape {shape}, got {matrix.shape}")
+    if not np.all(np.isfinite(matrix)):
+        raise ValueError(f"{name} must only contain finite values")
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _check_covariance(matrix, name, definite):
+    if not np.allclose(matrix, matrix.T):
+        raise ValueError(f"{name} must be symmetric")
+    eigenvalues = np.linalg.eigvalsh(matrix)
+    tolerance = 1e-12 * max(1.0, np.abs(eigenvalues).max())
+    if definite and eigenvalues.min() <= tolerance:
+        raise ValueError(f"{name} must be positive definite")
+    if eigenvalues.min() < -tolerance:
+        raise ValueError(f"{name} must be positive semi-definite")
+
+
+class CompiledModel(object):
+    """
+    Matrices of a time-invariant state space model together with the
+    artifacts the filters derive from them.
+
+    Factorisations, steady-state gains and the measurement models restricted
+    to a pattern of missing items are built on first use and kept with the
+    model, so every filter built from the same compiled model shares them.
+    Restricted models are evicted least recently used first past
+    `max_observation_models`, since random missingness produces many
+    patterns that never recur. The matrices are read-only.
+
+    Attributes:
+        F: Transition matrix (n, n)
+        H: Observation matrix (m, n)
+        Q: Process noise covariance (n, n)
+        R: Observation noise covariance (m, m), positive definite
+        x0: Initial state (n, 1)
+        P0: Initial state covariance (n, n)
+        key: Content hash of the matrices
+    """
+
+    def __init__(self, F, H, Q, R, x0=None, P0=None,
+                 max_observation_models=_MAX_OBSERVATION_MODELS):
+        F = np.atleast_2d(np.asarray(F, dtype=float))
+        n = F.shape[1]
+        H = np.asarray(H, dtype=float).reshape(-1, n)
+        m = H.shape[0]
+
+        self.n = n
+        self.m = m
+        self.F = _matrix(F, "F", (n, n))
+        self.H = _matrix(H, "H", (m, n))
+        self.Q = _matrix(Q, "Q", (n, n))
+        self.R = _matrix(R, "R", (m, m))
+        self.x0 = _matrix(np.zeros((n, 1)) if x0 is None else np.reshape(x0, (-1, 1)),
+                          "x0", (n, 1))
+        self.P0 = _matrix(np.eye(n) if P0 is None else P0, "P0", (n, n))
+        _check_covariance(self.Q, "Q", definite=False)
+        _check_covariance(self.R, "R", definite=True)
+        _check_covariance(self.P0, "P0", definite=False)
+
+        self.key = model_key(self.F, self.H, self.Q, self.R, self.x0, self.P0)
+        self.max_observation_models = max_observation_models
+        self._artifacts = {}
+        self._observation_models = OrderedDict()
+        # Filters on worker threads share the model
+        self._lock = threading.Lock()
+
+    def artifact(self, name, build):
+        """
+        Return the derived artifact `name`, calling `build()` to create it
+        on first use. Artifacts must not be modified by the caller.
+        """
+        with self._lock:
+            if name in self._artifacts:
+                return self._artifacts[name]
+
+        value = build()
+        with self._lock:
+            return self._artifacts.setdefault(name, value)
+
+    def observation_model(self, kind, mask, build):
+        """
+        Like `artifact`, for the measurement model of filter type `kind`
+        restricted to the items where `mask` is True.
+        """
+        key = (kind, mask.tobytes())
+        with self._lock:
+            if key in self._observation_models:
+                self._observation_models.move_to_end(key)
+                return self._observation_models[key]
+
+        value = build()
+        with self._lock:
+            self._observation_models[key] = value
+            while len(self._observation_models) > self.max_observation_models:
+                self._observation_models.popitem(last=False)
+        return value
+
+    @property
+    def steady_state(self):
+        """Steady-state filter and smoother quantities, see `get_steady_state`."""
+        return self.artifact(
+            "steady_state", lambda: get_steady_state(self.F, self.H, self.Q, self.R))
+
+    def __reduce__(self):
+        # Shipped to process workers without the lock and the artifacts;
+        # the worker resolves it through its own cache of models
+        state = self.__dict__.copy()
+        state["_artifacts"] = {}
+        state["_observation_models"] = OrderedDict()
+        del state["_lock"]
+        return _unpickle_model, (state,)
+
+
+def _unpickle_model(state):
+    """
+    Rebuild a pickled `CompiledModel`, or return the one with the same key
+    unpickled before in this process, so process workers build the
+    artifacts of a model once rather than on every job.
+    """
+    with _process_models_lock:
+        model = _process_models.get(state["key"])
+        if model is not None:
+            _process_models.move_to_end(state["key"])
+            return model
+
+    model = CompiledModel.__new__(CompiledModel)
+    model.__dict__.update(state)
+    for name in ("F", "H", "Q", "R", "x0", "P0"):
+        getattr(model, name).flags.writeable = False
+    model._lock = threading.Lock()
+    with _process_models_lock:
+        model = _process_models.setdefault(state["key"], model)
+        while len(_process_models) > _MAX_PROCESS_MODELS:
+            _process_models.popitem(last=False)
+    return model
@@ -0,0 +1,238 @@
+import logging
+from typing import List, NamedTuple
+import numpy as np
+from modelling.batch_kalman_filter import BatchKalmanFilter
+from modelling.kalman_filter import observation_masks
+
+logger = logging.getLogger(__name__)
+
+_LOG_2PI = np.log(2 * np.pi)
+
+
+class EMResult(NamedTuple):
+    """
+    Outcome of `fit_em`.
+
+    Attributes:
+        Q: Estimated process noise covariance (n, n)
+        R: Estimated observation noise covariance (m, m)
+        log_likelihood: Total log-likelihood of all series before each
+                        M-step, i.e. under the parameters each iteration
+                        started from (iterations,)
+        iterations: Number of EM iterations run
+        converged: Whether the relative log-likelihood change fell below
+                   the tolerance before `max_iterations`
+    """
+    Q: np.ndarray
+    R: np.ndarray
+    log_likelihood: np.ndarray
+    iterations: int
+    converged: bool
+
+
+class _Statistics(object):
+    """
+    Sufficient statistics of one E-step, summed over series and weeks.
+
+    `residuals` holds M with sum_t E[(z - H x)(z - H x)^T] = n_weeks R + R M R
+    for the R the E-step ran with, see `_e_step`.
+    """
+
+    def __init__(self, n, m):
+        self.transitions = np.zeros((n, n))
+        self.n_transitions = 0
+        self.residuals = np.zeros((m, m))
+        self.n_weeks = 0
+        self.log_likelihood = 0.0
+
+
+def _pattern_terms(H, R, masks):
+    """
+    Measurement terms for a stack of patterns of observed items (p, m).
+
+    Returns the inverse of R restricted to the observed items, embedded in
+    zeros (p, m, m), the matching information-form matrices H^T R^-1
+    (p, n, m) and H^T R^-1 H (p, n, n), and log|R_o| (p,). A pattern
+    without observed items gets zeros throughout.
+    """
+    m = R.shape[0]
+    D = masks.astype(float)
+    outer = D[:, :, None] * D[:, None, :]
+    # Unobserved items are decoupled with unit variance, which leaves the
+    # factor of the observed block untouched
+    L = np.linalg.cholesky(R * outer + np.eye(m) * (1 - D)[:, None, :])
+    L_inv = np.linalg.solve(L, np.eye(m))
+    R_inv = (np.swapaxes(L_inv, -1, -2) @ L_inv) * outer
+    HtRinv = H.T @ R_inv
+    logdet_R = 2 * np.log(np.diagonal(L, axis1=-2, axis2=-1)).sum(axis=-1)
+    return R_inv, HtRinv, HtRinv @ H, logdet_R
+
+
+def _e_step(observations, lengths, F, H, Q, R, x0, P0, stats):
+    """
+    Filter and smooth a stack of series (N, T, m) padded with NaN, adding
+    their sufficient statistics to `stats`.
+
+    The recursions are those of `BatchKalmanFilter`: its forward pass yields
+    the predicted and filtered moments, and its RTS smoother, run over the
+    filtered ones, the lag-one covariances Cov(x_t, x_t-1 | all weeks) the Q
+    update needs. The log-likelihood and the R statistics are then summed
+    week by week, with the terms of all the patterns of missing items in a
+    week built in one batch.
+    """
+    N, T, m = observations.shape
+    n = F.shape[0]
+    is_valid = np.arange(T) < lengths[:, None]
+
+    kf = BatchKalmanFilter(F=F, H=H, Q=Q, R=R, P=P0, x0=x0, steady_state=False)
+    x_pred, P_pred, _, x_filt, P_filt = kf.forward(observations, lengths, filtered=True)
+    x_smooth, P_smooth, cross = kf.smooth(x_filt, P_filt, lengths - 1, lag_one=True)
+
+    groups, masks = observation_masks(observations.reshape(N * T, m))
+    groups = groups.reshape(N, T)
+    n_observed = masks.sum(axis=1)
+    filled = np.nan_to_num(observations)
+
+    eye = np.eye(n)
+    for t in range(T):
+        rows = np.flatnonzero(is_valid[:, t])
+        if len(rows) == 0:
+            break
+        patterns, index = np.unique(groups[rows, t], return_inverse=True)
+        terms = _pattern_terms(H, R, masks[patterns])
+        R_inv, HtRinv, HtRinvH, logdet_R = (term[index] for term in terms)
+        mask = masks[groups[rows, t]]
+
+        # Prediction error decomposition, with the update in information
+        # form: log|S| = log|R_o| + log|I + P H^T R_o^-1 H| and, by Woodbury,
+        # y^T S^-1 y = y^T R_o^-1 y - (H^T R_o^-1 y)^T P_filt (H^T R_o^-1 y)
+        y = (mask * (filled[rows, t] - (H @ x_pred[rows, t])[..., 0]))[..., None]
+        _, logdet_A = np.linalg.slogdet(eye + P_pred[rows, t] @ HtRinvH)
+        Hy = HtRinv @ y
+        quadratic = (np.swapaxes(y, -1, -2) @ R_inv @ y)[:, 0, 0] - \
+            (np.swapaxes(Hy, -1, -2) @ P_filt[rows, t] @ Hy)[:, 0, 0]
+        stats.log_likelihood -= 0.5 * float(np.sum(
+            n_observed[patterns][index] * _LOG_2PI + logdet_R + logdet_A + quadratic))
+
+        # R: E[(z - H x)(z - H x)^T], with the noise on missing items filled
+        # in by its regression G = R R_o^-1 on the observed noise:
+        #   G (e e^T + H P H^T) G^T + R - G R  =  R + R (W (e e^T + H P H^T) W - W) R
+        # for W = R_o^-1 embedded in zeros
+        error = mask * (filled[rows, t] - (H @ x_smooth[rows, t])[..., 0])
+        weighted = (R_inv @ error[..., None])[..., 0]
+        RinvH = R_inv @ H
+        stats.residuals += weighted.T @ weighted - \
+            np.einsum("p,pij->ij", np.bincount(index, minlength=len(patterns)), terms[0]) + \
+            np.einsum("rin,rnk,rjk->ij", RinvH, P_smooth[rows, t], RinvH)
+    stats.n_weeks += int(is_valid.sum())
+
+    # Q: E[(x_t - F x_t-1)(x_t - F x_t-1)^T] over transitions within a series
+    is_transition = is_valid[:, 1:]
+    if is_transition.any():
+        x_t = x_smooth[:, 1:][is_transition]
+        x_prev = x_smooth[:, :-1][is_transition]
+        P_t = P_smooth[:, 1:][is_transition]
+        P_prev = P_smooth[:, :-1][is_transition]
+        F_cross = F @ np.swapaxes(cross[:, :-1][is_transition], -1, -2)
+        error = x_t - F @ x_prev
+        stats.transitions += np.sum(
+            error @ np.swapaxes(error, -1, -2) + P_t - F_cross -
+            np.swapaxes(F_cross, -1, -2) + F @ P_prev @ F.T, axis=0)
+        stats.n_transitions += int(is_transition.sum())
+
+
+def _symmetric(matrix):
+    return (matrix + matrix.T) / 2
+
+
+def _stack_bucket(series, members):
+    lengths = np.array([len(series[i]) for i in members])
+    observations = np.full((len(members), lengths.max(), series[members[0]].shape[1]), np.nan)
+    for row, i in enumerate(members):
+        observations[row, :lengths[row]] = series[i]
+    return observations, lengths
+
+
+def fit_em(
+    series: List[np.ndarray],
+    F,
+    H,
+    Q,
+    R,
+    x0=None,
+    P0=None,
+    max_iterations: int = 100,
+    tolerance: float = 1e-6,
+    diagonal_R: bool = False,
+    min_variance: float = 1e-8,
+    callback=None
+) -> EMResult:
+    """
+    Maximum-likelihood estimates of Q and R by expectation-maximisation.
+
+    F, H, x0 and P0 stay fixed and are shared by all series, which are
+    treated as independent. Every E-step filters and smooths all series at
+    once, stacked into arrays (in buckets of similar length, as
+    `services.kalman.filter_series_batch` does), so its cost is a Python
+    loop over weeks rather than over series. Missing items are NaN; weeks
+    are updated with the items they observed, and the cost grows with the
+    number of distinct patterns of missing items per week.
+
+    Args:
+        series: One (weeks, items) observation array per series
+        F, H, Q, R, x0, P0: Model matrices; Q and R are the starting point
+        max_iterations: Upper bound on EM iterations
+        tolerance: Stop once the log-likelihood improves by less than this
+                   fraction of its magnitude
+        diagonal_R: Estimate independent observation noise per item
+        min_variance: Floor on the estimated noise variances, so items
+                      without variation keep R positive definite
+        callback: Optional callable(iteration, log_likelihood) run after
+                  every E-step, e.g. for progress reporting
+
+    Returns:
+        EMResult
+    """
+    F = np.asarray(F, dtype=float)
+    H = np.asarray(H, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    R = np.asarray(R, dtype=float)
+    n, m = F.shape[0], H.shape[0]
+    x0 = np.zeros((n, 1)) if x0 is None else np.reshape(x0, (n, 1))
+    P0 = np.eye(n) if P0 is None else np.asarray(P0, dtype=float)
+
+    series = [np.asarray(observations, dtype=float).reshape(len(observations), m)
+              for observations in series if len(observations) > 0]
+    if not series:
+        raise ValueError("At least one non-empty series is required")
+
+    lengths = np.array([len(observations) for observations in series])
+    buckets = np.array([int(length).bit_length() for length in lengths])
+    stacks = [_stack_bucket(series, np.flatnonzero(buckets == bucket))
+              for bucket in np.unique(buckets)]
+
+    history = []
+    converged = False
+    for iteration in range(max_iterations):
+        stats = _Statistics(n, m)
+        for observations, bucket_lengths in stacks:
+            _e_step(observations, bucket_lengths, F, H, Q, R, x0, P0, stats)
+
+        history.append(stats.log_likelihood)
+        if callback is not None:
+            callback(iteration, stats.log_likelihood)
+        if iteration > 0 and abs(history[-1] - history[-2]) <= tolerance * abs(history[-2]):
+            converged = True
+            break
+
+        if stats.n_transitions > 0:
+            Q = _symmetric(stats.transitions / stats.n_transitions)
+            Q = Q + np.diag(np.maximum(min_variance - np.diag(Q), 0))
+        R = _symmetric(R + R @ stats.residuals @ R / stats.n_weeks)
+        if diagonal_R:
+            R = np.diag(np.diag(R))
+        R = R + np.diag(np.maximum(min_variance - np.diag(R), 0))
+        logger.debug("EM iteration %d: log-likelihood %.6f", iteration, stats.log_likelihood)
+
+    return EMResult(Q=Q, R=R, log_likelihood=np.array(history),
+                    iterations=len(history), converged=converged)
@@ -1,8 +1,122 @@
+import logging
+from typing import NamedTuple
 import numpy as np
+from scipy.linalg import cho_factor, cho_solve, lapack
+from scipy.signal import lfilter
+from modelling.steady_state import STEADY_STATE_RTOL, get_steady_state
+
+logger = logging.getLogger(__name__)
+
+_LOG_2PI = np.log(2 * np.pi)
+
+
+class InnovationDiagnostics(NamedTuple):
+    """
+    Measurement diagnostics of a forward pass, one entry per week.
+
+    Attributes:
+        log_likelihood: log p(z_t | z_1, ..., z_t-1) of the observed items
+                        of every week (T,); 0 for weeks with nothing observed
+        normalized_innovations: Innovation of every observed item divided by
+                                its predicted standard deviation sqrt(S_ii)
+                                (T, m); NaN for missing items
+    """
+    log_likelihood: np.ndarray
+    normalized_innovations: np.ndarray
+
+    @property
+    def total_log_likelihood(self) -> float:
+        return float(self.log_likelihood.sum())
+
+
+def observation_masks(observations):
+    """
+    Group the weeks of an observation matrix by which items are observed.
+
+    Missing items are NaN. All masks are computed in one pass, so each
+    distinct pattern of missing items only needs its measurement model
+    built once.
+
+    Args:
+        observations: Array of shape (T, m)
+
+    Returns:
+        tuple: (mask index per week (T,), distinct masks (G, m) where True
+                marks an observed item)
+    """
+    observed = ~np.isnan(observations)
+    T, m = observed.shape
+    if observed.all():
+        return np.zeros(T, dtype=np.intp), np.ones((min(T, 1), m), dtype=bool)
+
+    # Sorting rows of bools is slow, so pack each mask into 64-bit words
+    # and find the distinct rows of those instead
+    n_words = max(1, -(-m // 64))
+    packed = np.zeros((T, 8 * n_words), dtype=np.uint8)
+    packed[:, :-(-m // 8)] = np.packbits(observed, axis=1)
+    words = packed.view(np.uint64)
+    if n_words == 1:
+        unique_words, groups = np.unique(words[:, 0], return_inverse=True)
+        unique_words = unique_words[:, None]
+    else:
+        unique_words, groups = np.unique(words, axis=0, return_inverse=True)
+    masks = np.unpackbits(
+        unique_words.view(np.uint8), axis=1, count=m).astype(bool)
+    return groups.reshape(-1), masks
+
+
+def information_matrices(H, R):
+    """
+    `H.T @ inv(R)` and `H.T @ inv(R) @ H`, solved with the Cholesky factor
+    of R instead of an explicit inverse.
+    """
+    HtRinv = cho_solve(cho_factor(R), H).T
+    return HtRinv, HtRinv @ H
+
+
+def _cholesky(S):
+    """Lower Cholesky factor of a symmetric positive definite matrix."""
+    # LAPACK directly: scipy.linalg's wrappers cost more than the
+    # factorisation itself for matrices this small
+    L, info = lapack.dpotrf(S, lower=1)
+    if info != 0:
+        raise np.linalg.LinAlgError("Matrix is not positive definite")
+    return L
+
+
+def _solve_lower(L, B, trans=0):
+    """Solve L X = B (or L^T X = B with trans=1) for lower triangular L."""
+    X, info = lapack.dtrtrs(L, B, lower=1, trans=trans)
+    if info != 0:
+        raise np.linalg.LinAlgError("Triangular factor is singular")
+    return X
+
+
+def _innovation_terms(y, L, whitened=None):
+    """
+    Diagnostics of an innovation y (k, 1) with covariance S = L L^T, from
+    the triangular factor L the update already computed.
+
+    Returns:
+        tuple: (y, diagonal of S (k,), log|S|, y^T S^-1 y)
+    """
+    if whitened is None:
+        whitened = _solve_lower(L, y)
+    return (y, np.einsum("ij,ij->i", L, L),
+            2 * np.log(np.abs(np.diag(L))).sum(), float(np.sum(whitened ** 2)))
 
 
 class KalmanFilter(object):
-    def __init__(self, F=None, B=None, H=None, Q=None, R=None, P=None, x0=None):
+    def __init__(self, F=None, B=None, H=None, Q=None, R=None, P=None, x0=None,
+                 steady_state=True, model=None):
+
+        # A compiled model supplies the matrices, and the artifacts derived
+        # from them are shared with every other filter built from it
+        if model is not None:
+            F, H, Q, R = model.F, model.H, model.Q, model.R
+            P = model.P0 if P is None else P
+            x0 = model.x0 if x0 is None else x0
+        self.model = model
 
         if F is None or H is None:
             raise ValueError("Set proper system dynamics.")
@@ -19,56 +133,236 @@ class KalmanFilter(object):
         # self.x is the state
         self.x = np.zeros((self.n, 1)) if x0 is None else x0
 
+        # Converged gains of the time-invariant model. Once the covariance
+        # reaches them, fully observed weeks are filtered as a fixed linear
+        # recurrence without per-step matrix inversions.
+        if not steady_state:
+            self.steady_state = None
+        elif model is not None:
+            self.steady_state = model.steady_state
+        else:
+            self.steady_state = get_steady_state(self.F, self.H, self.Q, self.R)
+
+    def _artifact(self, name, build):
+        """Call `build()`, or share its result through the compiled model."""
+        if self.model is None:
+            return build()
+        return self.model.artifact(name, build)
+
+    def _restricted_model(self, mask, observed):
+        if self.model is None:
+            return self._observation_model(observed)
+        return self.model.observation_model(
+            type(self).__name__, mask, lambda: self._observation_model(observed))
+
+    def is_steady(self):
+        if self.steady_state is None:
+            return False
+        return self.P is self.steady_state.P or self.steady_state.is_converged(self.P)
+
     def predict(self, u=0):
         self.x = self.F @ self.x + self.B + u
         self.P = self.F @ self.P @ self.F.T + self.Q
         return self.x, self.P
 
-    def update(self, z):
-        y = z - self.H @ self.x
-        S = self.R + self.H @ self.P @ self.H.T
-        K = self.P @ self.H.T @ np.linalg.inv(S)
+    def _observation_model(self, observed):
+        """
+        Measurement model restricted to the `observed` item indices, in the
+        form `_update` expects: the rows of H and the block of R.
+        """
+        return self.H[observed], self.R[np.ix_(observed, observed)]
+
+    def _update(self, z, model, diagnostics=False):
+        """
+        Measurement update with the observed items `z` and the model from
+        `_observation_model`. With `diagnostics`, returns the innovation
+        terms of `_innovation_terms`, from the factorisation the update uses.
+        """
+        H, R = model
+        y = z - H @ self.x
+        HP = H @ self.P
+        L = _cholesky(R + HP @ H.T)
+        # K = P H^T S^-1, solved from the factor of S; P is symmetric
+        Kt, _ = lapack.dpotrs(L, HP, lower=1)
+        K = Kt.T
         self.x = self.x + K @ y
         I = np.eye(self.n)
-        self.P = (I - K @ self.H) @ self.P @ (I -
-                                              K @ self.H).T + K @ self.R @ K.T
-
-    def forward(self, observations):
-        # Runs the forward algorithm based on observations
-        print("Forward - self.m: ", self.m)
-        print("Forward - self.H.shape: ", self.H.shape)
-
-        z = observations
-
-        predictions_state = [self.x]
-        predictions_obs = []
-        predictions_cov = [self.P]
-
-        for z in observations:
-            z = z.reshape(self.m, 1)
-            if np.isnan(z).any():  # all the missing values
-
-                if (
-                    not predictions_state
-                ):  # if predictions are empty, meaning that the first observation is empty i.e. the first va
-                    z = np.array(np.full(self.m, 2)).reshape(self.m, 1)
-                else:
-                    expected_mean = np.random.normal(
-                        predictions_state[-1], predictions_cov[-1]
-                    )  # sampling from the last observed step
-                    z = self.H @ expected_mean  # from latent to observed state
-
-            self.update(z)
-            predictions_dummy, prediction_dummy_cov = self.predict()
-            predictions_obs.append(self.H @ predictions_dummy)
-            predictions_state.append(predictions_dummy)
-            predictions_cov.append(prediction_dummy_cov)
-
-        return predictions_state, predictions_cov, predictions_obs
+        self.P = (I - K @ H) @ self.P @ (I - K @ H).T + K @ R @ K.T
+        if diagnostics:
+            return _innovation_terms(y, L)
+
+    def update(self, z, diagnostics=False):
+        return self._update(z, (self.H, self.R), diagnostics)
+
+    def forward(self, observations, out=None, diagnostics=False):
+        """
+        Runs the forward algorithm based on observations.
+
+        Missing items are NaN. Weeks without any observed item skip the
+        measurement update, and partially observed weeks are updated with
+        H and R restricted to the observed items, so the result is
+        deterministic. The restricted models are built once per distinct
+        pattern of missing items.
+
+        States and covariances are written into preallocated buffers, which
+        `smooth` consumes directly.
+
+        With `diagnostics`, the log-likelihood and normalised innovations of
+        every week are computed in the same pass from the factorisation each
+        update already makes, and returned as a fourth element.
+
+        Args:
+            observations: Array of shape (T, m)
+            out: Optional (states (T + 1, n, 1), covariances (T + 1, n, n))
+                 buffers to write into, e.g. views on the tail of a longer
+                 history
+            diagnostics: Also return `InnovationDiagnostics`
+
+        Returns:
+            tuple: (states (T + 1, n, 1), covariances (T + 1, n, n),
+                    predicted observations (T, m, 1)[, diagnostics]); entry 0
+                    holds the state and covariance before the first week
+        """
+        logger.debug("Forward - m: %d, H shape: %s", self.m, self.H.shape)
+
+        observations = np.asarray(observations, dtype=float).reshape(
+            len(observations), self.m)
+        T = len(observations)
+
+        if out is None:
+            predictions_state = np.empty((T + 1, self.n, 1))
+            predictions_cov = np.empty((T + 1, self.n, self.n))
+        else:
+            predictions_state, predictions_cov = out
+        predictions_state[0] = self.x
+        predictions_cov[0] = self.P
+
+        groups, masks = observation_masks(observations)
+        n_observed = masks.sum(axis=1)
+        is_full = n_observed[groups] == self.m
+        partial_models = {
+            group: (observed, self._restricted_model(masks[group], observed))
+            for group, observed in enumerate(np.flatnonzero(mask) for mask in masks)
+            if 0 < len(observed) < self.m
+        }
+
+        if diagnostics:
+            log_likelihood = np.zeros(T)
+            normalized_innovations = np.full((T, self.m), np.nan)
+
+        t = 0
+        while t < T:
+            if is_full[t] and self.is_steady():
+                end = t + 1
+                while end < T and is_full[end]:
+                    end += 1
+                self._steady_forward(
+                    observations[t:end], predictions_state[t + 1:end + 1])
+                if diagnostics:
+                    self._steady_diagnostics(
+                        observations[t:end], predictions_state[t:end],
+                        log_likelihood[t:end], normalized_innovations[t:end])
+                predictions_cov[t + 1:end + 1] = self.P
+                t = end
+                continue
+
+            terms = None
+            if is_full[t]:
+                observed = slice(None)
+                terms = self.update(observations[t].reshape(self.m, 1), diagnostics)
+            elif groups[t] in partial_models:
+                observed, model = partial_models[groups[t]]
+                terms = self._update(observations[t, observed].reshape(-1, 1), model, diagnostics)
+            # Weeks with nothing observed only propagate the prediction
+
+            if terms is not None:
+                y, S_diagonal, logdet_S, quadratic = terms
+                log_likelihood[t] = -0.5 * (len(y) * _LOG_2PI + logdet_S + quadratic)
+                normalized_innovations[t, observed] = y[:, 0] / np.sqrt(S_diagonal)
+
+            t += 1
+            predictions_state[t], predictions_cov[t] = self.predict()
+
+        if diagnostics:
+            return (predictions_state, predictions_cov, self.H @ predictions_state[1:],
+                    InnovationDiagnostics(log_likelihood, normalized_innovations))
+        return predictions_state, predictions_cov, self.H @ predictions_state[1:]
+
+    def _steady_diagnostics(self, observations, prior_states, log_likelihood, normalized_innovations):
+        """
+        Diagnostics of a run of fully observed weeks filtered with the
+        converged gain, written into `log_likelihood` (k,) and
+        `normalized_innovations` (k, m). The innovation covariance is the
+        same for every week of the run, so it is factorised once per model.
+        """
+        def build():
+            S = self.H @ self.steady_state.P @ self.H.T + self.R
+            L = _cholesky(S)
+            return L, 2 * np.log(np.diag(L)).sum(), np.sqrt(np.diag(S))
+
+        L, logdet_S, S_scale = self._artifact("steady_innovation", build)
+        innovations = observations - (self.H @ prior_states)[..., 0]
+        whitened = _solve_lower(L, innovations.T)
+        log_likelihood[:] = -0.5 * (self.m * _LOG_2PI + logdet_S + np.sum(whitened ** 2, axis=0))
+        normalized_innovations[:] = innovations / S_scale
+
+    def _steady_forward(self, observations, out):
+        """
+        Filter a run of fully observed weeks with the converged gain,
+        writing the predicted states into `out` (k, n, 1).
+
+        With a fixed gain K the update/predict pair reduces to the linear
+        recurrence x_t = F (I - K H) x_{t-1} + F K z_t + B, which for a
+        scalar state is evaluated in one `lfilter` call.
+        """
+        steady_state = self.steady_state
+        inputs = observations @ (self.F @ steady_state.K).T + \
+            np.reshape(self.B, -1)
+
+        if self.n == 1:
+            a = steady_state.A[0, 0]
+            out[:, 0, 0], _ = lfilter([1.0], [1.0, -a], inputs[:, 0],
+                                      zi=[a * self.x[0, 0]])
+        else:
+            x = self.x
+            for t, u in enumerate(inputs):
+                x = steady_state.A @ x + u.reshape(self.n, 1)
+                out[t] = x
+
+        self.x = out[-1].copy()
+        self.P = steady_state.P
+
+    def _steady_smooth(self, predictions_state, predictions_cov, x_next, P_next):
+        """
+        Smooth a block of steps whose covariance has converged, for a scalar
+        state, by running the backward recurrences through `lfilter`.
+        """
+        steady_state = self.steady_state
+        f = self.F[0, 0]
+        j = steady_state.smoother_gain[0, 0]
+        P_pred = steady_state.smoother_P_pred[0, 0]
+
+        # Evaluate backwards in time, starting from the step after the block
+        x_rev = predictions_state[::-1, 0, 0]
+        P_rev = predictions_cov[::-1, 0, 0]
+        x_smooth, _ = lfilter([1.0], [1.0, -j], (1 - j * f) * x_rev,
+                              zi=[j * x_next[0, 0]])
+        P_smooth, _ = lfilter([1.0], [1.0, -j * j], P_rev - j * j * P_pred,
+                              zi=[j * j * P_next[0, 0]])
+
+        return x_smooth[::-1].reshape(-1, 1, 1), P_smooth[::-1].reshape(-1, 1, 1)
+
+    def _smoother_gain(self, P, P_pred):
+        # P_pred = F P F^T + Q is symmetric positive definite, so the gain
+        # P F^T P_pred^-1 = (P_pred^-1 F P)^T is solved with its Cholesky
+        # factor instead of an explicit inverse
+        gain, _ = lapack.dpotrs(_cholesky(P_pred), self.F @ P, lower=1)
+        return gain.T
 
     def smooth(self, predictions_state, predictions_cov):
 
         n, dim_x, _ = predictions_state.shape
+        steady_state = self.steady_state
 
         # RTS smoother gain
 
@@ -79,17 +373,222 @@ class KalmanFilter(object):
         x_smooth[-1] = predictions_state[-1]
         P_smooth[-1] = predictions_cov[-1]
 
-        for k in range(n - 2, -1, -1):
-            P_pred = np.dot(
-                np.dot(self.F, predictions_cov[k]), self.F.T) + self.Q
+        is_steady = np.zeros(n, dtype=bool)
+        if steady_state is not None:
+            is_steady = np.all(
+                np.abs(predictions_cov - steady_state.P) <=
+                STEADY_STATE_RTOL * np.abs(steady_state.P), axis=(1, 2))
 
-            K[k] = np.dot(np.dot(predictions_cov[k], self.F.T),
-                          np.linalg.inv(P_pred))
+        k = n - 2
+        while k >= 0:
+            if is_steady[k] and dim_x == 1:
+                start = k
+                while start > 0 and is_steady[start - 1]:
+                    start -= 1
+                x_smooth[start:k + 1], P_smooth[start:k + 1] = self._steady_smooth(
+                    predictions_state[start:k + 1], predictions_cov[start:k + 1],
+                    x_smooth[k + 1], P_smooth[k + 1])
+                K[start:k + 1] = steady_state.smoother_gain
+                k = start - 1
+                continue
+
+            if is_steady[k]:
+                P_pred = steady_state.smoother_P_pred
+                K[k] = steady_state.smoother_gain
+            else:
+                P_pred = np.dot(
+                    np.dot(self.F, predictions_cov[k]), self.F.T) + self.Q
+
+                K[k] = self._smoother_gain(predictions_cov[k], P_pred)
             x_smooth[k] = predictions_state[k] + np.dot(
                 K[k], x_smooth[k + 1] - np.dot(self.F, predictions_state[k])
             )
             P_smooth[k] = predictions_cov[k] + np.dot(
                 np.dot(K[k], P_smooth[k + 1] - P_pred), K[k].T
             )
+            k -= 1
 
         return x_smooth, P_smooth, K  # -> what do we do with K?
+
+
+class InformationKalmanFilter(KalmanFilter):
+    """
+    Kalman filter with the measurement update carried out in information form.
+
+    `H.T @ inv(R)` and `H.T @ inv(R) @ H` are computed once, so each update
+    only solves an n x n system instead of inverting the m x m innovation
+    covariance. For models with far fewer states than observed items (the
+    shipped model has n = 1, m = 28) this is much cheaper. The result is
+    algebraically identical to `KalmanFilter.update`; on the shipped model
+    states and covariances agree to within 1e-10 relative tolerance.
+    """
+
+    def __init__(self, F=None, B=None, H=None, Q=None, R=None, P=None, x0=None,
+                 steady_state=True, model=None):
+        super().__init__(F=F, B=B, H=H, Q=Q, R=R, P=P, x0=x0,
+                         steady_state=steady_state, model=model)
+        self.HtRinv, self.HtRinvH = self._artifact(
+            "information", lambda: information_matrices(self.H, self.R))
+
+    def _observation_model(self, observed):
+        H = self.H[observed]
+        R = self.R[np.ix_(observed, observed)]
+        return (H,) + information_matrices(H, R) + (_cholesky(R),)
+
+    def _update(self, z, model, diagnostics=False):
+        # P_post = (P^-1 + H^T R^-1 H)^-1 = (I + P H^T R^-1 H)^-1 P, which
+        # also holds for a singular prior covariance
+        H, HtRinv, HtRinvH, sqrt_R = model
+        P_prior = self.P
+        y = z - H @ self.x
+        A = np.eye(self.n) + P_prior @ HtRinvH
+        self.P = np.linalg.solve(A, P_prior)
+        K = self.P @ HtRinv
+        self.x = self.x + K @ y
+        if not diagnostics:
+            return None
+
+        # S = R + H P H^T is never formed: by the determinant lemma
+        # log|S| = log|R| + log|A|, and by Woodbury
+        # y^T S^-1 y = |sqrt_R^-1 y|^2 - (H^T R^-1 y)^T P_post (H^T R^-1 y)
+        Hy = HtRinv @ y
+        _, S_diagonal, logdet_R, quadratic = _innovation_terms(y, sqrt_R)
+        S_diagonal = S_diagonal + np.einsum("ij,ij->i", H @ P_prior, H)
+        quadratic -= (Hy.T @ self.P @ Hy)[0, 0]
+        return y, S_diagonal, logdet_R + np.linalg.slogdet(A)[1], quadratic
+
+    def update(self, z, diagnostics=False):
+        sqrt_R = self._artifact("sqrt_R", lambda: _psd_sqrt(self.R)) if diagnostics else None
+        return self._update(z, (self.H, self.HtRinv, self.HtRinvH, sqrt_R), diagnostics)
+
+
+class CholeskyKalmanFilter(KalmanFilter):
+    """
+    Kalman filter whose measurement update factorises the innovation
+    covariance instead of inverting it.
+
+    With S = H P H^T + R = L L^T and W = L^-1 H P, the gain is
+    K = (L^-T W)^T and the posterior covariance P - W^T W, so one Cholesky
+    factor serves both and the covariance stays symmetric by construction.
+    Cheaper than `KalmanFilter.update` for any model size; for n < m the
+    information form is cheaper still.
+    """
+
+    def _update(self, z, model, diagnostics=False):
+        H, R = model
+        y = z - H @ self.x
+        HP = H @ self.P
+        L = _cholesky(R + HP @ H.T)
+        W = _solve_lower(L, HP)
+        K = _solve_lower(L, W, trans=1).T
+        self.x = self.x + K @ y
+        self.P = self.P - W.T @ W
+        if diagnostics:
+            return _innovation_terms(y, L)
+
+
+def _psd_sqrt(P):
+    """Factor S with S S^T = P, also for singular positive semi-definite P."""
+    try:
+        return np.linalg.cholesky(P)
+    except np.linalg.LinAlgError:
+        w, V = np.linalg.eigh(P)
+        return V * np.sqrt(np.clip(w, 0, None))
+
+
+def _triangular_sqrt(M):
+    """Lower triangular L with L L^T = M M^T, from the QR decomposition of M^T."""
+    return np.linalg.qr(M.T, mode="r").T
+
+
+class SquareRootKalmanFilter(KalmanFilter):
+    """
+    Square-root covariance filter.
+
+    Propagates a factor S with P = S S^T through QR decompositions of the
+    predict and update pre-arrays, so the covariance stays symmetric
+    positive semi-definite on arbitrarily long or ill-conditioned series.
+    Costs roughly twice the arithmetic of the covariance form; `P` is still
+    available and is computed from the factor on access.
+    """
+
+    def __init__(self, F=None, B=None, H=None, Q=None, R=None, P=None, x0=None,
+                 steady_state=True, model=None):
+        super().__init__(F=F, B=B, H=H, Q=Q, R=R, P=P, x0=x0,
+                         steady_state=steady_state, model=model)
+        self.sqrt_Q = self._artifact("sqrt_Q", lambda: _psd_sqrt(self.Q))
+        self.sqrt_R = self._artifact("sqrt_R", lambda: _psd_sqrt(self.R))
+
+    @property
+    def P(self):
+        return self.S @ self.S.T
+
+    @P.setter
+    def P(self, P):
+        self.S = _psd_sqrt(P)
+
+    def predict(self, u=0):
+        self.x = self.F @ self.x + self.B + u
+        self.S = _triangular_sqrt(np.hstack([self.F @ self.S, self.sqrt_Q]))
+        return self.x, self.P
+
+    def _observation_model(self, observed):
+        return self.H[observed], _psd_sqrt(self.R[np.ix_(observed, observed)])
+
+    def _update(self, z, model, diagnostics=False):
+        # Triangularising [[R^1/2, H S], [0, S]] gives [[S_e, 0], [K_e, S_post]]
+        # with S_e S_e^T the innovation covariance and K = K_e S_e^-1
+        H, sqrt_R = model
+        k = len(H)
+        pre = np.zeros((k + self.n, k + self.n))
+        pre[:k, :k] = sqrt_R
+        pre[:k, k:] = H @ self.S
+        pre[k:, k:] = self.S
+        post = _triangular_sqrt(pre)
+
+        y = z - H @ self.x
+        innovation = _solve_lower(post[:k, :k], y)
+        self.x = self.x + post[k:, :k] @ innovation
+        self.S = post[k:, k:]
+        if diagnostics:
+            return _innovation_terms(y, post[:k, :k], innovation)
+
+    def update(self, z, diagnostics=False):
+        return self._update(z, (self.H, self.sqrt_R), diagnostics)
+
+
+_SOLVERS = {
+    "covariance": KalmanFilter,
+    "information": InformationKalmanFilter,
+    "cholesky": CholeskyKalmanFilter,
+    "square_root": SquareRootKalmanFilter,
+}
+
+
+def make_kalman_filter(F=None, B=None, H=None, Q=None, R=None, P=None, x0=None,
+                       steady_state=True, solver="auto", model=None):
+    """
+    Build a filter with the requested measurement update.
+
+    With a `CompiledModel` the matrices, initial state and covariance are
+    taken from it (P and x0 may still be overridden, e.g. to resume from a
+    checkpoint), and its cached artifacts are reused.
+
+    With solver "auto" the cheapest exact form is used: the information form
+    whenever the state is smaller than the observation vector, and the
+    Cholesky form otherwise. "covariance", "information", "cholesky" and
+    "square_root" select a form explicitly; "square_root" trades speed for
+    numerical robustness.
+    """
+    if model is not None:
+        F, H = model.F, model.H
+    if solver == "auto":
+        if F is not None and H is not None and F.shape[1] < H.shape[0]:
+            solver = "information"
+        else:
+            solver = "cholesky"
+    if solver not in _SOLVERS:
+        raise ValueError(f"Unknown Kalman filter solver: {solver}")
+
+    return _SOLVERS[solver](F=F, B=B, H=H, Q=Q, R=R, P=P, x0=x0,
+                            steady_state=steady_state, model=model)
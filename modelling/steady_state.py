@@ -0,0 +1,94 @@
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+from scipy.linalg import solve_discrete_are
+
+# Relative tolerance below which a covariance is treated as converged
+STEADY_STATE_RTOL = 1e-9
+
+_MAX_CACHED_MODELS = 32
+_steady_state_cache: "OrderedDict[str, Optional[SteadyState]]" = OrderedDict()
+
+
+class SteadyState(NamedTuple):
+    """
+    Converged quantities of a time-invariant Kalman filter and RTS smoother.
+
+    Attributes:
+        P: Converged predicted state covariance (n, n)
+        K: Converged Kalman gain (n, m)
+        P_post: Converged covariance after the measurement update (n, n)
+        A: Closed-loop transition F (I - K H) of the filter recurrence (n, n)
+        smoother_P_pred: F P F^T + Q as used by the smoother (n, n)
+        smoother_gain: Converged RTS smoother gain (n, n)
+    """
+    P: np.ndarray
+    K: np.ndarray
+    P_post: np.ndarray
+    A: np.ndarray
+    smoother_P_pred: np.ndarray
+    smoother_gain: np.ndarray
+
+    def is_converged(self, P) -> bool:
+        return bool(np.all(np.abs(P - self.P) <= STEADY_STATE_RTOL * np.abs(self.P)))
+
+
+def _model_key(F, H, Q, R) -> str:
+    digest = hashlib.sha1()
+    for matrix in (F, H, Q, R):
+        matrix = np.ascontiguousarray(matrix, dtype=float)
+        digest.update(str(matrix.shape).encode())
+        digest.update(matrix.tobytes())
+    return digest.hexdigest()
+
+
+def _solve_steady_state(F, H, Q, R) -> SteadyState:
+    n = F.shape[1]
+
+    # The predicted covariance solves the filtering DARE, which is the
+    # control DARE of the dual system (F^T, H^T)
+    P = solve_discrete_are(F.T, H.T, Q, R)
+    P = (P + P.T) / 2
+
+    S = H @ P @ H.T + R
+    K = np.linalg.solve(S, H @ P).T
+    I_KH = np.eye(n) - K @ H
+    P_post = I_KH @ P @ I_KH.T + K @ R @ K.T
+
+    smoother_P_pred = F @ P @ F.T + Q
+    smoother_gain = np.linalg.solve(smoother_P_pred, F @ P).T
+
+    return SteadyState(
+        P=P,
+        K=K,
+        P_post=P_post,
+        A=F @ I_KH,
+        smoother_P_pred=smoother_P_pred,
+        smoother_gain=smoother_gain,
+    )
+
+
+def get_steady_state(F, H, Q, R) -> Optional[SteadyState]:
+    """
+    Return the steady-state filter and smoother quantities of a model.
+
+    Solved once per distinct (F, H, Q, R) and cached. Returns None when the
+    Riccati equation has no stabilising solution, in which case callers have
+    to keep running the full recursion.
+    """
+    key = _model_key(F, H, Q, R)
+    if key in _steady_state_cache:
+        _steady_state_cache.move_to_end(key)
+        return _steady_state_cache[key]
+
+    try:
+        steady_state = _solve_steady_state(F, H, Q, R)
+    except (ValueError, np.linalg.LinAlgError):
+        steady_state = None
+
+    _steady_state_cache[key] = steady_state
+    if len(_steady_state_cache) > _MAX_CACHED_MODELS:
+        _steady_state_cache.popitem(last=False)
+    return steady_state
@@ -13,3 +13,6 @@ class Account(Base):
     quota = Column(Integer, nullable=False, default=0)
 
     data = relationship("Data", back_populates="account")
+    series_states = relationship("SeriesState", back_populates="account")
+    kalman_models = relationship("KalmanModel", back_populates="account")
+    jobs = relationship("Job", back_populates="account")
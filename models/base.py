@@ -1,12 +1,18 @@
 from datetime import datetime, UTC
-from sqlalchemy import Column, DateTime, Integer
+from sqlalchemy import Column, DateTime, Integer, func
 from sqlalchemy.orm import DeclarativeBase
 
 
+def utc_now() -> datetime:
+    return datetime.now(UTC)
+
+
 class Base(DeclarativeBase):
     __abstract__ = True
 
     id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime(timezone=True), default=datetime.now(UTC))
-    updated_at = Column(DateTime(timezone=True), default=datetime.now(UTC),
-                        onupdate=datetime.now(UTC))
+    # Callables so the timestamp is taken per row, not once at import time
+    created_at = Column(DateTime(timezone=True), default=utc_now,
+                        server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=utc_now,
+                        server_default=func.now(), onupdate=utc_now)
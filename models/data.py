@@ -1,13 +1,33 @@
-from sqlalchemy import Column, String, ForeignKey, Integer
+import numpy as np
+from sqlalchemy import Column, String, ForeignKey, Integer, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from models.base import Base
+from models.types import PackedArray
+from core.config import settings
 from sqlalchemy.orm import relationship
 
 
 class Data(Base):
     __tablename__ = "data"
-    unique_identifier = Column(String, index=True)
-    data = Column(JSONB, nullable=False)
+    __table_args__ = (
+        # Reading a series is a single range scan in append order
+        Index("ix_data_account_identifier_seq",
+              "account_id", "unique_identifier", "seq", unique=True),
+    )
+
+    unique_identifier = Column(String)
+    # Position of this chunk within its series, starting at 0
+    seq = Column(Integer, nullable=False)
+    # Legacy rows store weeks as JSONB nested lists; new rows store them as
+    # a packed (weeks, items) float array in `observations`
+    data = Column(JSONB, nullable=True)
+    observations = Column(PackedArray(settings.SERIES_STORAGE_DTYPE), nullable=True)
     account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
 
     account = relationship("Account", back_populates="data")
+
+    def to_array(self) -> np.ndarray:
+        """Return the stored weeks as a (weeks, items) array."""
+        if self.observations is not None:
+            return self.observations
+        return np.array(self.data, dtype=float)
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String
+from sqlalchemy.dialects.postgresql import JSONB
+from models.base import Base
+from models.types import PackedArray
+from sqlalchemy.orm import relationship
+
+
+class Job(Base):
+    """
+    Background job queued through the "database" job queue backend.
+
+    Workers claim queued rows with `SELECT ... FOR UPDATE SKIP LOCKED`, so
+    any number of worker processes can consume the table concurrently.
+    A running job whose lease (`started_at` + JOB_LEASE_SECONDS) expired,
+    e.g. because its worker died, is claimed again until it has been
+    attempted JOB_MAX_ATTEMPTS times.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claiming scans queued jobs in id order
+        Index("ix_jobs_status_id", "status", "id"),
+        # Per-account limits count the unfinished jobs of an account
+        Index("ix_jobs_account_status", "account_id", "status"),
+    )
+
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    # queued, running, succeeded or failed
+    status = Column(String, nullable=False, default="queued")
+    params = Column(JSONB, nullable=False, default=dict)
+    # Optional (weeks, items) input of the job
+    observations = Column(PackedArray(), nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # JSON-serialisable part of the result, and its arrays packed with
+    # models.types.pack_named_arrays
+    result = Column(JSONB, nullable=True)
+    result_arrays = Column(LargeBinary, nullable=True)
+    error = Column(String, nullable=True)
+
+    account = relationship("Account", back_populates="jobs")
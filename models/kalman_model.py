@@ -0,0 +1,40 @@
+from sqlalchemy import (
+    Boolean, Column, ForeignKey, Index, Integer, String, UniqueConstraint, text
+)
+from models.base import Base
+from models.types import PackedArray
+from sqlalchemy.orm import relationship
+
+
+class KalmanModel(Base):
+    """
+    State space model registered by an account.
+
+    Models are immutable once stored, so `model_key`, the content hash of
+    the matrices, identifies their compiled artifacts and cached results.
+    At most one model per account is its default.
+    """
+    __tablename__ = "kalman_models"
+    __table_args__ = (
+        UniqueConstraint("account_id", "name",
+                         name="uq_kalman_models_account_name"),
+        Index("uq_kalman_models_account_default", "account_id", unique=True,
+              postgresql_where=text("is_default")),
+    )
+
+    name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    is_default = Column(Boolean, nullable=False, default=False)
+    model_key = Column(String, nullable=False)
+
+    # Transition (n, n), observation (m, n), process noise (n, n),
+    # observation noise (m, m), initial state (n, 1) and covariance (n, n)
+    F = Column(PackedArray(), nullable=False)
+    H = Column(PackedArray(), nullable=False)
+    Q = Column(PackedArray(), nullable=False)
+    R = Column(PackedArray(), nullable=False)
+    x0 = Column(PackedArray(), nullable=False)
+    P0 = Column(PackedArray(), nullable=False)
+
+    account = relationship("Account", back_populates="kalman_models")
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, String, ForeignKey, Integer, UniqueConstraint
+from models.base import Base
+from models.types import PackedArray
+from sqlalchemy.orm import relationship
+
+
+class SeriesState(Base):
+    """
+    Kalman filter checkpoint for a saved series.
+
+    Holds the last predicted state/covariance so that newly appended weeks can
+    resume the forward pass instead of replaying the full history, together
+    with the per-step filter outputs already returned to the client.
+    """
+    __tablename__ = "series_states"
+    __table_args__ = (
+        UniqueConstraint("account_id", "unique_identifier",
+                         name="uq_series_states_account_identifier"),
+    )
+
+    unique_identifier = Column(String, nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    n_observations = Column(Integer, nullable=False, default=0)
+    # Content hash of the model the series was filtered with; NULL for
+    # series filtered with the shipped model before the registry existed
+    model_key = Column(String, nullable=True)
+    # Sequence number of the next Data chunk appended to the series
+    next_seq = Column(Integer, nullable=False, default=0)
+
+    # Last predicted state (n, 1) and covariance (n, n)
+    x = Column(PackedArray(), nullable=False)
+    P = Column(PackedArray(), nullable=False)
+
+    # Per-step outputs: states (T + 1, n, 1), covariances (T + 1, n, n),
+    # filtered observations (T,) and smoothed states (T + 1, n, 1)
+    raw_state = Column(PackedArray(), nullable=False)
+    raw_cov = Column(PackedArray(), nullable=False)
+    filtered_data = Column(PackedArray(), nullable=False)
+    smooth_state = Column(PackedArray(), nullable=False)
+
+    account = relationship("Account", back_populates="series_states")
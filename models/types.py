@@ -0,0 +1,124 @@
+import struct
+from typing import Dict, Tuple
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# Layout: dtype code (1 byte), ndim (1 byte), ndim little-endian uint32
+# dimensions, then the little-endian array data in C order
+_DTYPES = {b"f": np.dtype("<f4"), b"d": np.dtype("<f8")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+def pack_array(array, dtype="<f8") -> bytes:
+    """Serialise a float array with its shape into a compact buffer."""
+    dtype = np.dtype(dtype)
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported dtype for packed arrays: {dtype}")
+
+    array = np.ascontiguousarray(array, dtype=dtype)
+    header = _DTYPE_CODES[dtype] + struct.pack(
+        f"<B{array.ndim}I", array.ndim, *array.shape)
+    return header + array.tobytes()
+
+
+def unpack_array_from(buffer: bytes, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """
+    Rebuild the array packed at `offset` in `buffer`, e.g. one of several
+    `pack_array` outputs written back to back.
+
+    Returns:
+        tuple: (read-only array view on `buffer`, offset just past the array)
+
+    Raises:
+        ValueError: If the buffer does not hold a complete packed array
+    """
+    if len(buffer) < offset + 2:
+        raise ValueError("Packed array header is truncated")
+
+    dtype = _DTYPES.get(bytes(buffer[offset:offset + 1]))
+    if dtype is None:
+        raise ValueError("Unsupported dtype code in packed array")
+
+    ndim = buffer[offset + 1]
+    data_offset = offset + 2 + 4 * ndim
+    if len(buffer) < data_offset:
+        raise ValueError("Packed array header is truncated")
+
+    shape = struct.unpack_from(f"<{ndim}I", buffer, offset + 2)
+    count = int(np.prod(shape))
+    end = data_offset + count * dtype.itemsize
+    if len(buffer) < end:
+        raise ValueError("Packed array data is truncated")
+
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_offset)
+    return array.reshape(shape), end
+
+
+def unpack_array(buffer: bytes) -> np.ndarray:
+    """
+    Rebuild an array from `pack_array` output without copying the data.
+
+    The result is a read-only view on `buffer`.
+    """
+    return unpack_array_from(buffer)[0]
+
+
+def pack_named_arrays(arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Serialise named float arrays back to back: for each array a uint16
+    name length, the UTF-8 name and its `pack_array` frame.
+    """
+    parts = []
+    for name, array in arrays.items():
+        encoded = name.encode()
+        parts.append(struct.pack("<H", len(encoded)) + encoded + pack_array(array))
+    return b"".join(parts)
+
+
+def unpack_named_arrays(buffer: bytes) -> Dict[str, np.ndarray]:
+    """
+    Rebuild the arrays written by `pack_named_arrays` as read-only views.
+
+    Raises:
+        ValueError: If the buffer is truncated or malformed
+    """
+    arrays = {}
+    offset = 0
+    while offset < len(buffer):
+        if len(buffer) < offset + 2:
+            raise ValueError("Array name header is truncated")
+        (length,) = struct.unpack_from("<H", buffer, offset)
+        offset += 2
+        if len(buffer) < offset + length:
+            raise ValueError("Array name is truncated")
+        name = bytes(buffer[offset:offset + length]).decode()
+        arrays[name], offset = unpack_array_from(buffer, offset + length)
+    return arrays
+
+
+class PackedArray(TypeDecorator):
+    """
+    Stores a NumPy float array as a `BYTEA` buffer with dtype and shape
+    metadata, and loads it back with `np.frombuffer`.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype="<f8"):
+        super().__init__()
+        self.dtype = dtype
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return pack_array(value, self.dtype)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return unpack_array(value)
+
+    def compare_values(self, x, y):
+        # Arrays don't compare to a single bool; a new array means a change
+        return x is y
@@ -0,0 +1,14 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class JobOutput(BaseModel):
+    job_id: int = Field(description="Identifier to poll the job with")
+    kind: str = Field(description="Kind of job, e.g. \"kalman\"")
+    status: str = Field(description="queued, running, succeeded or failed")
+    attempts: int = Field(description="Number of times a worker started the job")
+    error: Optional[str] = Field(default=None, description="Why the job failed")
+    created_at: Optional[datetime] = Field(default=None, description="When the job was submitted")
+    started_at: Optional[datetime] = Field(default=None, description="When the current attempt started")
+    finished_at: Optional[datetime] = Field(default=None, description="When the job succeeded or failed")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import List, Optional
+from core.config import settings
 
 
 class KalmanInput(BaseModel):
@@ -15,6 +16,21 @@ class KalmanInput(BaseModel):
         default=None,
         description="The unique identifier for the data"
     )
+    full_smooth: bool = Field(
+        default=False,
+        description="When extending a saved series, re-run the smoother over the "
+                    "whole history instead of only the most recent weeks"
+    )
+    model: Optional[str] = Field(
+        default=None,
+        description="Name of a registered model to filter with, or \"default\" for "
+                    "the shipped model. Defaults to the account's default model."
+    )
+    diagnostics: bool = Field(
+        default=False,
+        description="Also return the log-likelihood and normalised innovations of "
+                    "every week, computed in the same filter pass"
+    )
 
     @model_validator(mode="after")
     def validate_unique_identifier_if_save(self) -> 'KalmanInput':
@@ -45,6 +61,79 @@ class KalmanOutput(BaseModel):
     smooth_state: List[float] = Field(
         description="The smoothed state values from the Kalman filter"
     )
-    input_data: List[List[float]] = Field(
-        description="The original input data"
+    input_data: Optional[List[List[float]]] = Field(
+        default=None,
+        description="The original input data, omitted when include_input is false"
+    )
+    log_likelihood: Optional[List[float]] = Field(
+        default=None,
+        description="Log-likelihood of every input week given the weeks before it, "
+                    "0 for weeks with nothing observed; with diagnostics only"
+    )
+    normalized_innovations: Optional[List[List[Optional[float]]]] = Field(
+        default=None,
+        description="Per input week, the innovation of every item divided by its "
+                    "predicted standard deviation, null for missing items; with "
+                    "diagnostics only"
+    )
+    total_log_likelihood: Optional[float] = Field(
+        default=None,
+        description="Sum of log_likelihood, e.g. to compare models; with diagnostics only"
+    )
+
+
+class KalmanBatchInput(BaseModel):
+    series: List[List[List[float]]] = Field(
+        description="One 2D array of weekly observations per series. "
+                    "All series are filtered with the same model in a single pass."
+    )
+    model: Optional[str] = Field(
+        default=None,
+        description="Name of a registered model to filter with, or \"default\" for "
+                    "the shipped model. Defaults to the account's default model."
+    )
+
+    @field_validator('series')
+    def validate_series(cls, v):
+        # Checked before the quota is charged; the number of items per week
+        # is checked against the model once it is resolved
+        if len(v) > settings.KALMAN_BATCH_MAX_SERIES:
+            raise ValueError(
+                f"A batch may contain at most {settings.KALMAN_BATCH_MAX_SERIES} series")
+        if not v or any(not weeks for weeks in v):
+            raise ValueError("Every series must contain at least one week")
+
+        n_items = len(v[0][0])
+        if n_items == 0:
+            raise ValueError("Every week must contain at least one observation")
+        if any(len(week) != n_items for weeks in v for week in weeks):
+            raise ValueError(f"Every week must contain {n_items} observations")
+        return v
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "series": [
+                    [[10.2, 10.5, 10.1, 9.8, 10.3]],
+                    [[9.7, 10.1, 10.4, 10.0, 9.9], [10.2, 10.5, 10.1, 9.8, 10.3]]
+                ]
+            }
+        }
+
+
+class KalmanSeriesOutput(BaseModel):
+    filtered_data: List[float] = Field(
+        description="The filtered time series values after applying the Kalman filter"
+    )
+    raw_state: List[float] = Field(
+        description="The raw state values from the Kalman filter"
+    )
+    smooth_state: List[float] = Field(
+        description="The smoothed state values from the Kalman filter"
+    )
+
+
+class KalmanBatchOutput(BaseModel):
+    results: List[KalmanSeriesOutput] = Field(
+        description="The filter outputs for each input series, in input order"
     )
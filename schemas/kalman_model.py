@@ -0,0 +1,109 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class KalmanModelInput(BaseModel):
+    name: str = Field(
+        min_length=1, max_length=100,
+        description="Name the model is selected by, unique per account"
+    )
+    description: Optional[str] = Field(
+        default=None,
+        description="Free text description of the model"
+    )
+    F: List[List[float]] = Field(description="State transition matrix (n, n)")
+    H: List[List[float]] = Field(description="Observation matrix (m, n), one row per item")
+    Q: List[List[float]] = Field(description="Process noise covariance (n, n)")
+    R: List[List[float]] = Field(
+        description="Observation noise covariance (m, m), positive definite")
+    x0: Optional[List[float]] = Field(
+        default=None,
+        description="Initial state (n,), zeros by default"
+    )
+    P0: Optional[List[List[float]]] = Field(
+        default=None,
+        description="Initial state covariance (n, n), the identity by default"
+    )
+    default: bool = Field(
+        default=False,
+        description="Use this model for the account's requests that don't name a model"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "two-items",
+                "F": [[1.0]],
+                "H": [[1.0], [1.0]],
+                "Q": [[0.1]],
+                "R": [[0.3, 0.1], [0.1, 0.4]],
+                "default": False
+            }
+        }
+
+
+class KalmanModelOutput(BaseModel):
+    name: str = Field(description="Name the model is selected by")
+    description: Optional[str] = Field(default=None, description="Description of the model")
+    default: bool = Field(description="Whether this is the account's default model")
+    model_key: str = Field(description="Content hash of the model matrices")
+    n_states: int = Field(description="Size n of the state")
+    n_items: int = Field(description="Number m of items observed per week")
+    created_at: Optional[datetime] = Field(default=None, description="When the model was registered")
+    F: Optional[List[List[float]]] = Field(default=None, description="State transition matrix")
+    H: Optional[List[List[float]]] = Field(default=None, description="Observation matrix")
+    Q: Optional[List[List[float]]] = Field(default=None, description="Process noise covariance")
+    R: Optional[List[List[float]]] = Field(default=None, description="Observation noise covariance")
+    x0: Optional[List[float]] = Field(default=None, description="Initial state")
+    P0: Optional[List[List[float]]] = Field(default=None, description="Initial state covariance")
+
+
+class KalmanModelList(BaseModel):
+    models: List[KalmanModelOutput] = Field(
+        description="The registered models of the account, by name; the shipped "
+                    "model is always available as \"default\" and is not listed"
+    )
+
+
+class ModelFitInput(BaseModel):
+    name: str = Field(
+        min_length=1, max_length=100,
+        description="Name to register the fitted model under, unique per account"
+    )
+    description: Optional[str] = Field(
+        default=None,
+        description="Free text description of the model, a summary of the fit by default"
+    )
+    base_model: Optional[str] = Field(
+        default=None,
+        description="Model to start from, whose F, H, x0 and P0 are kept; the "
+                    "account's default model by default, \"default\" for the shipped one"
+    )
+    unique_identifiers: Optional[List[str]] = Field(
+        default=None,
+        description="Stored series to fit on; all series of the account by default"
+    )
+    max_iterations: int = Field(default=100, ge=1, le=1000, description="Upper bound on EM iterations")
+    tolerance: float = Field(
+        default=1e-6, gt=0,
+        description="Stop once the log-likelihood improves by less than this fraction of its magnitude"
+    )
+    diagonal_R: bool = Field(
+        default=False,
+        description="Estimate independent observation noise per item"
+    )
+    default: bool = Field(
+        default=False,
+        description="Make the fitted model the account's default model"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "fitted-2026-10",
+                "base_model": "default",
+                "max_iterations": 100,
+                "tolerance": 1e-6
+            }
+        }
@@ -1,5 +1,9 @@
+import numpy as np
 from pydantic import BaseModel, Field, field_validator
 from typing import List
+from core.config import settings
+
+PANAS_ITEMS = 20
 
 
 class PanasInput(BaseModel):
@@ -19,9 +23,10 @@ class PanasInput(BaseModel):
 
     @field_validator('results')
     def validate_results_range(cls, v):
-        for item in v:
-            if item < 1 or item > 5:
-                raise ValueError("PANAS responses must be between 1 and 5")
+        form = np.asarray(v, dtype=float)
+        # Written so NaN, which fails every comparison, is rejected too
+        if (~((form >= 1) & (form <= 5))).any():
+            raise ValueError("PANAS responses must be between 1 and 5")
         return v
 
 
@@ -34,3 +39,51 @@ class PanasOutput(BaseModel):
     positive_affect: float = Field(..., description="Positive Affect score")
     negative_affect: float = Field(..., description="Negative Affect score")
     input_data: List[float] = Field(..., description="Original input data")
+
+
+class PanasBatchInput(BaseModel):
+    """
+    Input schema for scoring many PANAS forms at once, e.g. a survey wave.
+
+    Expects an (N, 20) matrix with one form of Likert scale responses (1-5)
+    per row.
+    """
+    results: List[List[float]] = Field(
+        ..., description="One row of 20 Likert scale responses (1-5) per form")
+
+    @field_validator('results')
+    def validate_results_matrix(cls, v):
+        # Checked before the quota is charged, and before converting the rows
+        if len(v) > settings.PANAS_BATCH_MAX_FORMS:
+            raise ValueError(
+                f"A batch may contain at most {settings.PANAS_BATCH_MAX_FORMS} forms")
+
+        # Shape and range are checked on the whole matrix at once
+        try:
+            forms = np.asarray(v, dtype=float)
+        except ValueError:
+            raise ValueError(
+                f"Every PANAS form must have exactly {PANAS_ITEMS} items")
+
+        if forms.ndim != 2 or forms.shape[0] == 0:
+            raise ValueError("At least one PANAS form is required")
+        if forms.shape[1] != PANAS_ITEMS:
+            raise ValueError(
+                f"Every PANAS form must have exactly {PANAS_ITEMS} items")
+
+        invalid_rows = np.flatnonzero((~((forms >= 1) & (forms <= 5))).any(axis=1))
+        if len(invalid_rows):
+            raise ValueError(
+                "PANAS responses must be between 1 and 5, invalid rows: "
+                f"{invalid_rows[:10].tolist()}")
+        return v
+
+
+class PanasBatchOutput(BaseModel):
+    """
+    Output schema for batch PANAS scoring.
+
+    Scores are returned column-wise, in the order of the input rows.
+    """
+    positive_affect: List[float] = Field(..., description="Positive Affect score per form")
+    negative_affect: List[float] = Field(..., description="Negative Affect score per form")
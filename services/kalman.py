@@ -1,42 +1,332 @@
 import numpy as np
-from typing import List, Tuple, Any, Dict, Optional
-from modelling.kalman_filter import KalmanFilter
-from modelling.constants import F, H, Q, R, x0
+from typing import List, Tuple, Any, Dict, Optional, Union
+from modelling.kalman_filter import InnovationDiagnostics, KalmanFilter, make_kalman_filter
+from modelling.batch_kalman_filter import BatchKalmanFilter
+from modelling.compiled_model import CompiledModel
 from models.data import Data
-from sqlalchemy import select
+from models.series_state import SeriesState
+from core.config import settings
+from core.batching import MicroBatcher
+from core.database import AsyncSessionLocal, release_connection
+from core.executor import ExecutorSaturatedError, run_modelling
+from core.jobs import JobInfo, JobResult, register_job_handler
+from core.result_cache import cache_key, get_result_cache
+from services.model_registry import DEFAULT_MODEL, resolve_model
+from sqlalchemy import select, text
+
+# Bump when a change to the filter or smoother alters results, so cached
+# results from earlier versions are no longer served
+_RESULT_CACHE_NAMESPACE = "kalman:v1"
+
+_coalescer: Optional[MicroBatcher] = None
+
+
+def _run_forward(
+    kf: KalmanFilter, observations: np.ndarray, out=None, diagnostics: bool = False
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[InnovationDiagnostics]]:
+    """
+    Run the forward pass, optionally into preallocated buffers.
+
+    Returns:
+        tuple: (states (T + 1, n, 1), covariances (T + 1, n, n),
+                filtered observations (T,), diagnostics or None)
+    """
+    if diagnostics:
+        raw_state, raw_cov, predictions_obs, innovations = kf.forward(
+            observations, out=out, diagnostics=True)
+    else:
+        raw_state, raw_cov, predictions_obs = kf.forward(observations, out=out)
+        innovations = None
+    return raw_state, raw_cov, np.ascontiguousarray(predictions_obs[:, 0, 0]), innovations
+
+
+def filter_series(observations: np.ndarray,
+                  model: CompiledModel = DEFAULT_MODEL,
+                  diagnostics: bool = False) -> Dict[str, Any]:
+    """
+    Filter and smooth a full series from the model's initial state.
+
+    Pure function so it can run in a worker thread or process.
+
+    Returns:
+        Dictionary with the final state `x`/`P` and the per-step
+        `raw_state`, `raw_cov`, `filtered_data` and `smooth_state` arrays,
+        plus the week's `InnovationDiagnostics` as `diagnostics` when
+        requested
+    """
+    kf = make_kalman_filter(model=model, solver=settings.KALMAN_SOLVER)
+    raw_state, raw_cov, filtered_data, innovations = _run_forward(
+        kf, observations, diagnostics=diagnostics)
+    smooth_state, _, _ = kf.smooth(raw_state, raw_cov)
+
+    output = {
+        "x": kf.x,
+        "P": kf.P,
+        "raw_state": raw_state,
+        "raw_cov": raw_cov,
+        "filtered_data": filtered_data,
+        "smooth_state": smooth_state
+    }
+    if innovations is not None:
+        output["diagnostics"] = innovations
+    return output
+
+
+def extend_series(
+    checkpoint: Dict[str, np.ndarray],
+    observations: np.ndarray,
+    full_smooth: bool,
+    smooth_lag: int,
+    model: CompiledModel = DEFAULT_MODEL,
+    diagnostics: bool = False
+) -> Dict[str, Any]:
+    """
+    Resume the forward pass from a checkpoint and re-smooth the tail.
+
+    The RTS backward recursion at step k only depends on the filtered
+    estimate at k and the smoothed estimate at k + 1, so smoothing the last
+    `smooth_lag` + new steps from the end is exact for those steps; older
+    smoothed values are kept from the checkpoint.
+
+    Args:
+        checkpoint: Arrays previously returned by `filter_series` or
+                    `extend_series`
+        observations: The newly appended weeks
+        full_smooth: Re-smooth the whole history instead of the lag window
+        smooth_lag: Number of trailing steps re-smoothed besides the new ones
+        model: The model the checkpoint was filtered with
+        diagnostics: Also return the diagnostics of the new weeks
+
+    Returns:
+        Dictionary in the same format as `filter_series`
+    """
+    kf = make_kalman_filter(model=model, P=checkpoint["P"], x0=checkpoint["x"],
+                            solver=settings.KALMAN_SOLVER)
+
+    # Copy the history once into buffers sized for the whole series and
+    # resume the forward pass into their tail. The first entry of the
+    # resumed pass is the checkpoint itself.
+    history = len(checkpoint["raw_state"]) - 1
+    raw_state = np.empty((history + len(observations) + 1,) + checkpoint["raw_state"].shape[1:])
+    raw_cov = np.empty((len(raw_state),) + checkpoint["raw_cov"].shape[1:])
+    raw_state[:history] = checkpoint["raw_state"][:history]
+    raw_cov[:history] = checkpoint["raw_cov"][:history]
+    _, _, new_filtered, innovations = _run_forward(
+        kf, observations, out=(raw_state[history:], raw_cov[history:]),
+        diagnostics=diagnostics)
+    filtered_data = np.concatenate(
+        [checkpoint["filtered_data"], new_filtered])
+
+    if full_smooth:
+        smooth_state, _, _ = kf.smooth(raw_state, raw_cov)
+    else:
+        window = min(len(raw_state), smooth_lag + len(observations) + 1)
+        smooth_tail, _, _ = kf.smooth(raw_state[-window:], raw_cov[-window:])
+        smooth_state = np.concatenate(
+            [checkpoint["smooth_state"][:len(raw_state) - window], smooth_tail])
+
+    output = {
+        "x": kf.x,
+        "P": kf.P,
+        "raw_state": raw_state,
+        "raw_cov": raw_cov,
+        "filtered_data": filtered_data,
+        "smooth_state": smooth_state
+    }
+    if innovations is not None:
+        output["diagnostics"] = innovations
+    return output
+
+
+def filter_series_batch(series: List[np.ndarray],
+                        model: CompiledModel = DEFAULT_MODEL) -> List[Dict[str, np.ndarray]]:
+    """
+    Filter and smooth many independent series from the initial state with
+    the vectorised batch filter.
+
+    Series are grouped by length (powers of two) so a long series doesn't
+    pad a batch of short ones. Pure function so it can run in a worker
+    thread or process.
+
+    Args:
+        series: One (weeks, items) observation array per series
+        model: The model shared by all series
+
+    Returns:
+        One dictionary per series, in input order, in the same format as
+        `filter_series`
+    """
+    lengths = np.array([len(observations) for observations in series])
+    buckets = np.array([int(length).bit_length() for length in lengths])
+    results: List[Optional[Dict[str, np.ndarray]]] = [None] * len(series)
+
+    for bucket in np.unique(buckets):
+        members = np.flatnonzero(buckets == bucket)
+        bucket_lengths = lengths[members]
+        n_items = series[members[0]].shape[1]
+
+        # Pad shorter series with NaN up to the longest one
+        observations = np.full(
+            (len(members), bucket_lengths.max(), n_items), np.nan)
+        for row, i in enumerate(members):
+            observations[row, :lengths[i]] = series[i]
+
+        kf = BatchKalmanFilter(model=model)
+        states, covs, predictions_obs = kf.forward(observations, bucket_lengths)
+        smooth_states, _ = kf.smooth(states, covs, bucket_lengths)
+
+        # Copies, so a cached result doesn't keep the arrays of the whole
+        # bucket alive
+        for row, i in enumerate(members):
+            length = lengths[i]
+            results[i] = {
+                "x": states[row, length].copy(),
+                "P": covs[row, length].copy(),
+                "raw_state": states[row, :length + 1].copy(),
+                "raw_cov": covs[row, :length + 1].copy(),
+                "filtered_data": predictions_obs[row, :length, 0, 0].copy(),
+                "smooth_state": smooth_states[row, :length + 1].copy()
+            }
+
+    return results
+
+
+async def _filter_coalesced(
+    requests: List[Tuple[CompiledModel, np.ndarray]]
+) -> List[Dict[str, np.ndarray]]:
+    # One batch pass per distinct model among the coalesced requests
+    by_model: Dict[str, List[int]] = {}
+    for i, (model, _) in enumerate(requests):
+        by_model.setdefault(model.key, []).append(i)
+
+    results: List[Optional[Dict[str, np.ndarray]]] = [None] * len(requests)
+    for members in by_model.values():
+        series = [requests[i][1] for i in members]
+        outputs = await run_modelling(
+            filter_series_batch, series, requests[members[0]][0],
+            weight=sum(len(observations) for observations in series))
+        for i, output in zip(members, outputs):
+            results[i] = output
+    return results
+
+
+def get_kalman_coalescer() -> Optional[MicroBatcher]:
+    """
+    Return the process-wide coalescer for unsaved single-series requests,
+    or None when KALMAN_COALESCE_WINDOW_MS is 0.
+    """
+    global _coalescer
+
+    if settings.KALMAN_COALESCE_WINDOW_MS <= 0:
+        return None
+
+    if _coalescer is None:
+        _coalescer = MicroBatcher(
+            _filter_coalesced,
+            max_wait=settings.KALMAN_COALESCE_WINDOW_MS / 1000,
+            max_size=settings.KALMAN_COALESCE_MAX_SERIES
+        )
+    return _coalescer
+
+
+async def _lock_series(db, account_id: int, unique_identifier: str):
+    """
+    Take a transaction-scoped advisory lock on a series. Unlike the row lock
+    on its checkpoint it also serialises the first saves of a series, which
+    have no series_states row to lock yet and would otherwise compute the
+    same next_seq.
+    """
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"{account_id}:{unique_identifier}"})
+
+
+async def _load_series_state(db, account_id: int, unique_identifier: str) -> Optional[SeriesState]:
+    """
+    Fetch the checkpoint of a saved series, locking it for the rest of the
+    transaction so concurrent appends to the same series are serialised.
+    """
+    query = select(SeriesState).where(
+        SeriesState.account_id == account_id,
+        SeriesState.unique_identifier == unique_identifier
+    ).with_for_update()
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def _load_series_history(db, account_id: int, unique_identifier: str) -> List[np.ndarray]:
+    """
+    Fetch every stored chunk of weeks of a series in append order, as one
+    range read on the (account_id, unique_identifier, seq) index.
+
+    Only used when a series has no checkpoint yet, or its checkpoint was
+    filtered with another model.
+    """
+    existing_data_query = select(Data).where(
+        Data.unique_identifier == unique_identifier,
+        Data.account_id == account_id
+    ).order_by(Data.seq)
+
+    result = await db.execute(existing_data_query)
+    return [record.to_array() for record in result.scalars().all()]
 
 
 async def process_kalman_filter(
-    input_data: List[List[float]],
+    input_data: Union[List[List[float]], np.ndarray],
     save: bool = False,
     unique_identifier: Optional[str] = None,
     db=None,
-    account_id: Optional[int] = None
+    account_id: Optional[int] = None,
+    full_smooth: bool = False,
+    model: CompiledModel = DEFAULT_MODEL,
+    diagnostics: bool = False
 ) -> Dict[str, Any]:
     """
     Process input data through a Kalman filter.
 
+    The filtering itself runs on the modelling executor, off the event loop.
+    Unsaved requests are served from the result cache when the same
+    observations were filtered recently, and are otherwise coalesced with
+    concurrent ones into one batch filter pass when
+    KALMAN_COALESCE_WINDOW_MS is set.
+
     Args:
-        input_data: List of lists of float values to be filtered
+        input_data: List of lists of float values to be filtered, or an
+                    equivalent (weeks, items) array
                    Each inner list represents a week of observations
         save: Whether to save the results to the database
         unique_identifier: Identifier for saving data (required when save=True)
         db: Database session for saving data
         account_id: Account ID for associating saved data
+        full_smooth: When extending a saved series, run the RTS smoother over
+                     the whole history instead of the trailing lag window
+        model: Compiled model to filter with, see
+               `services.model_registry.resolve_model`. A saved series
+               extended with a different model than before is refiltered
+               from its full history.
+        diagnostics: Also return the log-likelihood of every input week
+                     (T,), their normalised innovations (T, m) and the total
+                     log-likelihood, given any saved history. Requests with
+                     diagnostics are not coalesced.
 
     Returns:
-        Dictionary containing filtered values, raw state, and smoothed state
+        Dictionary containing the filtered values (T,), raw states (T + 1, n)
+        and smoothed states (T + 1, n) as NumPy arrays, and with diagnostics
+        `log_likelihood`, `normalized_innovations` and `total_log_likelihood`
 
     Raises:
         ValueError: If input data is invalid
+        ExecutorSaturatedError: If the modelling workers are saturated
     """
     try:
         # Basic validation - ensure we have data
-        if not input_data or any(len(week) == 0 for week in input_data):
+        observations = np.asarray(input_data, dtype=float)
+        if observations.ndim != 2 or observations.size == 0:
             raise ValueError(
                 "Input data must contain non-empty lists of observations")
-
-        observations = None
+        if observations.shape[1] != model.m:
+            raise ValueError(
+                f"Every week must contain {model.m} observations")
 
         # Handle save case
         if save:
@@ -48,65 +338,182 @@ async def process_kalman_filter(
                 raise ValueError(
                     "Database session is required for save operation")
 
-            # First, save the new data
-            new_data_entry = Data(
+            await _lock_series(db, account_id, unique_identifier)
+            state = await _load_series_state(db, account_id, unique_identifier)
+
+            # Resume from the checkpoint, or replay the history once to build
+            # it, also when the checkpoint was filtered with another model
+            if state is None or (state.model_key or DEFAULT_MODEL.key) != model.key:
+                history = await _load_series_history(db, account_id, unique_identifier)
+                all_data = np.concatenate(history + [observations])
+                output = await run_modelling(
+                    filter_series, all_data, model, diagnostics, weight=len(all_data))
+                if state is None:
+                    state = SeriesState(
+                        unique_identifier=unique_identifier,
+                        account_id=account_id,
+                        next_seq=len(history)
+                    )
+                    db.add(state)
+                state.n_observations = len(all_data)
+                state.model_key = model.key
+            else:
+                checkpoint = {
+                    "x": state.x,
+                    "P": state.P,
+                    "raw_state": state.raw_state,
+                    "raw_cov": state.raw_cov,
+                    "filtered_data": state.filtered_data,
+                    "smooth_state": state.smooth_state
+                }
+                output = await run_modelling(
+                    extend_series, checkpoint, observations,
+                    full_smooth, settings.KALMAN_SMOOTH_LAG, model, diagnostics,
+                    weight=len(input_data) + (state.n_observations if full_smooth else 0))
+                state.n_observations = state.n_observations + len(input_data)
+
+            state.x = output["x"]
+            state.P = output["P"]
+            state.raw_state = output["raw_state"]
+            state.raw_cov = output["raw_cov"]
+            state.filtered_data = output["filtered_data"]
+            state.smooth_state = output["smooth_state"]
+            data_count = state.n_observations
+
+            db.add(Data(
                 unique_identifier=unique_identifier,
-                data=input_data,
+                seq=state.next_seq,
+                observations=observations,
                 account_id=account_id
-            )
-            db.add(new_data_entry)
+            ))
+            state.next_seq = state.next_seq + 1
             await db.commit()
+        else:
+            # For non-save case, just use the input data. The result only
+            # depends on the model and the observations, so identical
+            # requests are served from the result cache.
+            result_cache = get_result_cache()
+            if result_cache is not None:
+                key = cache_key(
+                    f"{_RESULT_CACHE_NAMESPACE}:{settings.KALMAN_SOLVER}:{model.key}"
+                    f"{':diagnostics' if diagnostics else ''}",
+                    observations)
+                cached = await result_cache.get(key)
+                if cached is not None:
+                    return cached
 
-            # Then, fetch all existing data for this unique_identifier
-            existing_data_query = select(Data).where(
-                Data.unique_identifier == unique_identifier,
-                Data.account_id == account_id
-            ).order_by(Data.created_at)
+            # The batch filter doesn't compute diagnostics
+            coalescer = None if diagnostics else get_kalman_coalescer()
+            if coalescer is not None:
+                output = await coalescer.submit((model, observations))
+            else:
+                output = await run_modelling(
+                    filter_series, observations, model, diagnostics, weight=len(input_data))
+            data_count = len(input_data)
 
-            result = await db.execute(existing_data_query)
-            existing_records = result.scalars().all()
+        # Return all the data, states as (T + 1, n) arrays
+        raw_state = output["raw_state"]
+        smooth_state = output["smooth_state"]
+        result = {
+            "filtered_data": output["filtered_data"],
+            "raw_state": raw_state.reshape(len(raw_state), -1),
+            "smooth_state": smooth_state.reshape(len(smooth_state), -1),
+            "data_count": data_count
+        }
+        if diagnostics:
+            # A replayed history also yields diagnostics for the stored weeks
+            innovations = output["diagnostics"]
+            result["log_likelihood"] = innovations.log_likelihood[-len(observations):]
+            result["normalized_innovations"] = innovations.normalized_innovations[-len(observations):]
+            result["total_log_likelihood"] = float(result["log_likelihood"].sum())
+        if not save and result_cache is not None:
+            await result_cache.set(key, result)
+        return result
 
-            # Combine all data for processing
-            all_data = []
-            for record in existing_records:
-                all_data.extend(record.data)
+    except ExecutorSaturatedError:
+        if save and db:
+            await db.rollback()
+        raise
 
-            # Convert combined data to numpy array
-            observations = np.array(all_data)
-        else:
-            # For non-save case, just use the input data
-            observations = np.array(input_data)
+    except Exception as e:
+        # If database operation failed, rollback
+        if save and db:
+            await db.rollback()
+        # Re-raise with more context
+        raise ValueError(f"Error processing Kalman filter: {str(e)}")
 
-        # Create and run Kalman filter with constants from constants.py
-        kf = KalmanFilter(F=F, H=H, Q=Q, R=R, x0=x0)
 
-        # Run the filter forward pass
-        raw_state, predictions_cov, predictions_obs = kf.forward(
-            observations)
+def process_kalman_batch(series: List[List[List[float]]],
+                         model: CompiledModel = DEFAULT_MODEL) -> List[Dict[str, Any]]:
+    """
+    Process many independent series through the Kalman filter in one pass.
 
-        # Run the smoother
-        smooth_state, cov_smooth, K = kf.smooth(
-            np.array(raw_state), np.array(predictions_cov)
-        )
+    Pure function so it can run on the modelling executor.
 
-        # Flatten the arrays for easier handling
-        raw_state_flat = np.array(raw_state).flatten().tolist()
-        smooth_state_flat = np.array(smooth_state).flatten().tolist()
+    Args:
+        series: One list of weekly observations per series. Series may have
+                different numbers of weeks.
+        model: Compiled model to filter with
 
-        # Convert numpy arrays to Python lists for JSON serialization
-        filtered_data = [float(obs[0][0]) for obs in predictions_obs]
+    Returns:
+        List with one dictionary of filtered values, raw state and smoothed
+        state per input series, in input order
 
-        # Return all the data
-        return {
-            "filtered_data": filtered_data,
-            "raw_state": raw_state_flat,
-            "smooth_state": smooth_state_flat,
-            "data_count": len(observations) if observations is not None else 0
-        }
+    Raises:
+        ValueError: If input data is invalid
+    """
+    if not series or any(not weeks for weeks in series):
+        raise ValueError("Every series must contain at least one week")
 
+    try:
+        outputs = filter_series_batch(
+            [np.asarray(weeks, dtype=float) for weeks in series], model)
     except Exception as e:
-        # If database operation failed, rollback
-        if save and db:
-            await db.rollback()
-        # Re-raise with more context
-        raise ValueError(f"Error processing Kalman filter: {str(e)}")
+        raise ValueError(f"Error processing Kalman filter batch: {str(e)}")
+
+    return [
+        {
+            "filtered_data": output["filtered_data"].tolist(),
+            "raw_state": output["raw_state"].flatten().tolist(),
+            "smooth_state": output["smooth_state"].flatten().tolist(),
+            "data_count": len(output["filtered_data"])
+        }
+        for output in outputs
+    ]
+
+
+async def run_kalman_job(job: JobInfo) -> JobResult:
+    """
+    Handler of "kalman" background jobs: runs `process_kalman_filter` on the
+    job's observations with its parameters (save, unique_identifier,
+    full_smooth, model and diagnostics), in a database session of its own.
+
+    Returns:
+        tuple: ({"data_count": ...[, "total_log_likelihood": ...]}, the
+                filtered_data, raw_state and smooth_state arrays[, and the
+                log_likelihood and normalized_innovations arrays])
+    """
+    params = job.params
+    save = params.get("save", False)
+    async with AsyncSessionLocal() as db:
+        model = await resolve_model(db, job.account_id, params.get("model"))
+        if not save:
+            await release_connection(db)
+        result = await process_kalman_filter(
+            input_data=job.observations,
+            save=save,
+            unique_identifier=params.get("unique_identifier"),
+            db=db if save else None,
+            account_id=job.account_id if save else None,
+            full_smooth=params.get("full_smooth", False),
+            model=model,
+            diagnostics=params.get("diagnostics", False)
+        )
+
+    names = ("filtered_data", "raw_state", "smooth_state", "log_likelihood", "normalized_innovations")
+    arrays = {name: result[name] for name in names if name in result}
+    summary = {name: result[name] for name in ("data_count", "total_log_likelihood") if name in result}
+    return summary, arrays
+
+
+register_job_handler("kalman", run_kalman_job)
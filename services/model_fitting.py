@@ -0,0 +1,138 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from modelling.em import EMResult, fit_em
+from models.data import Data
+from models.kalman_model import KalmanModel
+from core.database import AsyncSessionLocal, release_connection
+from core.executor import run_modelling
+from core.jobs import JobInfo, JobResult, register_job_handler
+from services.model_registry import get_model, register_model, resolve_model
+
+
+async def load_account_series(db, account_id: int,
+                              unique_identifiers: Optional[List[str]] = None) -> List[np.ndarray]:
+    """
+    Read the stored series of an account, each as one (weeks, items) array.
+
+    Args:
+        db: Database session
+        account_id: Account the series belong to
+        unique_identifiers: Only read these series; all of them by default
+
+    Returns:
+        list: One array per series, in identifier order
+    """
+    query = select(Data).where(Data.account_id == account_id)
+    if unique_identifiers is not None:
+        query = query.where(Data.unique_identifier.in_(unique_identifiers))
+    query = query.order_by(Data.unique_identifier, Data.seq)
+
+    chunks = {}
+    for record in (await db.execute(query)).scalars().all():
+        chunks.setdefault(record.unique_identifier, []).append(record.to_array())
+    return [np.concatenate(parts) for parts in chunks.values()]
+
+
+async def fit_model(
+    db,
+    account_id: int,
+    name: str,
+    base_model: Optional[str] = None,
+    unique_identifiers: Optional[List[str]] = None,
+    max_iterations: int = 100,
+    tolerance: float = 1e-6,
+    diagonal_R: bool = False,
+    description: Optional[str] = None,
+    is_default: bool = False
+) -> Tuple[KalmanModel, EMResult]:
+    """
+    Estimate Q and R from the stored series of an account by EM and register
+    the result as a new model.
+
+    The fit starts from `base_model` and keeps its F, H, x0 and P0; see
+    `modelling.em.fit_em`. It runs on the modelling executor.
+
+    Args:
+        base_model: Registered model name, "default" for the shipped model,
+                    or None for the account's default model
+
+    Returns:
+        tuple: (registered model, EMResult)
+
+    Raises:
+        ValueError: If the name is taken, the base model is unknown, there
+                    are no stored series, or they don't match the base model
+    """
+    if await get_model(db, account_id, name) is not None:
+        raise ValueError(f"A model named '{name}' already exists")
+    model = await resolve_model(db, account_id, base_model)
+
+    series = await load_account_series(db, account_id, unique_identifiers)
+    series = [observations for observations in series if len(observations) > 0]
+    if not series:
+        raise ValueError("No stored series to fit the model on")
+    if any(observations.shape[1] != model.m for observations in series):
+        raise ValueError(f"Every stored week must contain {model.m} observations")
+
+    n_weeks = sum(len(observations) for observations in series)
+    await release_connection(db)
+    result = await run_modelling(
+        fit_em, series, model.F, model.H, model.Q, model.R, model.x0, model.P0,
+        max_iterations=max_iterations,
+        tolerance=tolerance,
+        diagonal_R=diagonal_R,
+        weight=n_weeks
+    )
+
+    if description is None:
+        description = f"EM fit of '{base_model or 'account default'}' on " \
+                      f"{len(series)} series ({n_weeks} weeks)"
+    record = await register_model(
+        db, account_id,
+        name=name,
+        F=model.F,
+        H=model.H,
+        Q=result.Q,
+        R=result.R,
+        x0=model.x0,
+        P0=model.P0,
+        description=description,
+        is_default=is_default
+    )
+    return record, result
+
+
+async def run_fit_job(job: JobInfo) -> JobResult:
+    """
+    Handler of "fit_model" background jobs: runs `fit_model` with the job's
+    parameters in a database session of its own.
+
+    Returns:
+        tuple: ({"model", "model_key", "iterations", "converged",
+                 "log_likelihood"}, no arrays)
+    """
+    params = job.params
+    async with AsyncSessionLocal() as db:
+        record, result = await fit_model(
+            db, job.account_id,
+            name=params["name"],
+            base_model=params.get("base_model"),
+            unique_identifiers=params.get("unique_identifiers"),
+            max_iterations=params.get("max_iterations", 100),
+            tolerance=params.get("tolerance", 1e-6),
+            diagonal_R=params.get("diagonal_R", False),
+            description=params.get("description"),
+            is_default=params.get("default", False)
+        )
+
+    return {
+        "model": record.name,
+        "model_key": record.model_key,
+        "iterations": result.iterations,
+        "converged": result.converged,
+        "log_likelihood": result.log_likelihood.tolist()
+    }, {}
+
+
+register_job_handler("fit_model", run_fit_job)
@@ -0,0 +1,200 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from modelling.compiled_model import CompiledModel
+from modelling.constants import F, H, Q, R, x0
+from models.kalman_model import KalmanModel
+from core.config import settings
+
+# Name that always selects the shipped model, and can't be registered
+DEFAULT_MODEL_NAME = "default"
+
+# The shipped model, used for accounts without a default model of their own
+DEFAULT_MODEL = CompiledModel(F=F, H=H, Q=Q, R=R, x0=x0)
+
+_MAX_RESOLVED = 10000
+
+# model_key -> compiled model, least recently used first
+_compiled: "OrderedDict[str, CompiledModel]" = OrderedDict()
+# (account_id, name or None for the account default) -> (expiry, model)
+_resolved: "OrderedDict[Tuple[int, Optional[str]], Tuple[float, CompiledModel]]" = OrderedDict()
+
+
+def compile_model(record: KalmanModel) -> CompiledModel:
+    """
+    Return the compiled form of a registered model.
+
+    Compiled models are shared by every request using them, so their
+    factorisations and gains are built once. Past MODEL_CACHE_SIZE models
+    the least recently used one is dropped along with its artifacts.
+    """
+    compiled = _compiled.get(record.model_key)
+    if compiled is not None:
+        _compiled.move_to_end(record.model_key)
+        return compiled
+
+    compiled = CompiledModel(F=record.F, H=record.H, Q=record.Q, R=record.R,
+                             x0=record.x0, P0=record.P0)
+    _compiled[record.model_key] = compiled
+    while len(_compiled) > max(settings.MODEL_CACHE_SIZE, 0):
+        _compiled.popitem(last=False)
+    return compiled
+
+
+def invalidate_account_models(account_id: int):
+    """Forget which models the requests of an account resolve to."""
+    for key in [key for key in _resolved if key[0] == account_id]:
+        del _resolved[key]
+
+
+async def resolve_model(db, account_id: int, name: Optional[str] = None) -> CompiledModel:
+    """
+    Return the compiled model a request should be filtered with.
+
+    Args:
+        db: Database session, only used when the resolution isn't cached
+        account_id: Account making the request
+        name: Registered model name, "default" for the shipped model, or
+              None for the account's default model (the shipped model if
+              it has none)
+
+    Raises:
+        ValueError: If the account has no model called `name`
+    """
+    if name == DEFAULT_MODEL_NAME:
+        return DEFAULT_MODEL
+
+    key = (account_id, name)
+    entry = _resolved.get(key)
+    if entry is not None and entry[0] >= time.monotonic():
+        _resolved.move_to_end(key)
+        compiled = entry[1]
+        if compiled.key in _compiled:
+            _compiled.move_to_end(compiled.key)
+        return compiled
+
+    query = select(KalmanModel).where(KalmanModel.account_id == account_id)
+    if name is None:
+        query = query.where(KalmanModel.is_default.is_(True))
+    else:
+        query = query.where(KalmanModel.name == name)
+    record = (await db.execute(query)).scalar_one_or_none()
+
+    if record is not None:
+        compiled = compile_model(record)
+    elif name is None:
+        compiled = DEFAULT_MODEL
+    else:
+        raise ValueError(f"Unknown model: {name}")
+
+    if settings.MODEL_REGISTRY_TTL > 0:
+        _resolved[key] = (time.monotonic() + settings.MODEL_REGISTRY_TTL, compiled)
+        _resolved.move_to_end(key)
+        while len(_resolved) > _MAX_RESOLVED:
+            _resolved.popitem(last=False)
+    return compiled
+
+
+async def list_models(db, account_id: int) -> List[KalmanModel]:
+    query = select(KalmanModel).where(
+        KalmanModel.account_id == account_id).order_by(KalmanModel.name)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def get_model(db, account_id: int, name: str) -> Optional[KalmanModel]:
+    query = select(KalmanModel).where(
+        KalmanModel.account_id == account_id, KalmanModel.name == name)
+    return (await db.execute(query)).scalar_one_or_none()
+
+
+async def _clear_default(db, account_id: int, keep: Optional[int] = None):
+    query = update(KalmanModel).where(
+        KalmanModel.account_id == account_id, KalmanModel.is_default.is_(True))
+    if keep is not None:
+        query = query.where(KalmanModel.id != keep)
+    await db.execute(query.values(is_default=False))
+
+
+async def register_model(
+    db,
+    account_id: int,
+    name: str,
+    F,
+    H,
+    Q,
+    R,
+    x0=None,
+    P0=None,
+    description: Optional[str] = None,
+    is_default: bool = False
+) -> KalmanModel:
+    """
+    Validate and store a new model for an account.
+
+    The model is compiled once up front, so invalid matrices are rejected
+    here rather than on first use.
+
+    Raises:
+        ValueError: If the matrices are inconsistent or not valid
+                    covariances, or the name is taken
+    """
+    if name == DEFAULT_MODEL_NAME:
+        raise ValueError(f"The model name '{DEFAULT_MODEL_NAME}' is reserved")
+
+    compiled = CompiledModel(F=F, H=H, Q=Q, R=R, x0=x0, P0=P0)
+    if await get_model(db, account_id, name) is not None:
+        raise ValueError(f"A model named '{name}' already exists")
+
+    try:
+        if is_default:
+            await _clear_default(db, account_id)
+        record = KalmanModel(
+            name=name,
+            description=description,
+            account_id=account_id,
+            is_default=is_default,
+            model_key=compiled.key,
+            F=compiled.F,
+            H=compiled.H,
+            Q=compiled.Q,
+            R=compiled.R,
+            x0=compiled.x0,
+            P0=compiled.P0
+        )
+        db.add(record)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError(f"A model named '{name}' already exists")
+
+    invalidate_account_models(account_id)
+    return record
+
+
+async def set_default_model(db, account_id: int, name: str) -> Optional[KalmanModel]:
+    """
+    Make `name` the model used by requests of the account that don't name
+    one; "default" reverts to the shipped model.
+
+    Returns:
+        The new default model, or None when reverting to the shipped model
+
+    Raises:
+        ValueError: If the account has no model called `name`
+    """
+    record = None
+    if name != DEFAULT_MODEL_NAME:
+        record = await get_model(db, account_id, name)
+        if record is None:
+            raise ValueError(f"Unknown model: {name}")
+
+    await _clear_default(db, account_id, keep=record.id if record is not None else None)
+    if record is not None:
+        record.is_default = True
+    await db.commit()
+
+    invalidate_account_models(account_id)
+    return record
+
@@ -27,3 +27,25 @@ def process_panas_form(form_data):
     pa_na = (form_data @ panas_loadings).flatten()
 
     return pa_na  # Returns [PA, NA] array
+
+
+def process_panas_batch(forms):
+    """
+    Score many PANAS forms with a single (N, 20) @ (20, 2) product.
+
+    Args:
+        forms: (N, 20) matrix with one form of Likert scale responses per row
+
+    Returns:
+        np.ndarray: (N, 2) array with the PA and NA score of every form
+
+    Raises:
+        ValueError: If the input is not an (N, 20) matrix
+    """
+    forms = np.asarray(forms, dtype=float)
+
+    if forms.ndim != 2 or forms.shape[1] != 20:
+        raise ValueError(
+            f"PANAS batch must be an (N, 20) matrix, got shape {forms.shape}")
+
+    return forms @ panas_loadings